@@ -0,0 +1,266 @@
+"""Shopping list exporters.
+
+Every exporter renders a ``ShoppingList`` as a generator of ``bytes``
+chunks, so the document can be streamed without building it in memory.
+"""
+
+import csv
+from datetime import datetime
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+def format_amount(amount):
+    """Amount rounded to hundredths, without a trailing ``.0``."""
+    amount = round(amount, 2)
+    return int(amount) if amount.is_integer() else amount
+
+
+class ShoppingList:
+    """Data of a shopping list document.
+
+    ``ingredients`` are rows of ShoppingListManager.canonical_totals().
+    """
+
+    def __init__(self, user, ingredients, recipes):
+        self.user = user
+        self.ingredients = ingredients
+        self.recipes = recipes
+        self.created = datetime.utcnow()
+
+    def lines(self):
+        yield "Фудграм - Список покупок"
+        yield f"Дата: {self.created.strftime('%Y-%m-%d %H:%M:%S')} UTC"
+        yield f"Пользователь: {self.user.username}"
+        yield ""
+        yield "Ингредиенты:"
+
+        for i, item in enumerate(self.ingredients, 1):
+            yield (
+                f"{i}. {item['name'].title()} - "
+                f"{format_amount(item['amount'])} "
+                f"{item['measurement_unit']}"
+            )
+
+        yield ""
+        yield "Рецепты:"
+
+        for recipe in self.recipes:
+            yield f"- {recipe.name} (автор: {recipe.author.get_full_name()})"
+
+        yield ""
+        yield f"Фудграм - Ваш кулинарный помощник © {self.created.year}"
+
+
+class ShoppingListExporter:
+    """Base class for shopping list exporters."""
+
+    format = None
+    content_type = None
+
+    @property
+    def filename(self):
+        return f"shopping_list.{self.format}"
+
+    def render(self, shopping_list):
+        raise NotImplementedError
+
+
+class TextExporter(ShoppingListExporter):
+    format = "txt"
+    content_type = "text/plain; charset=utf-8"
+
+    def render(self, shopping_list):
+        for line in shopping_list.lines():
+            yield f"{line}\n".encode()
+
+
+class _Echo:
+    """File-like object returning what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+class CSVExporter(ShoppingListExporter):
+    format = "csv"
+    content_type = "text/csv; charset=utf-8"
+
+    def render(self, shopping_list):
+        writer = csv.writer(_Echo())
+        # BOM lets spreadsheet software detect UTF-8.
+        yield "\ufeff".encode()
+        yield writer.writerow(
+            ("№", "ингредиент", "количество", "единица измерения")
+        ).encode()
+        for i, item in enumerate(shopping_list.ingredients, 1):
+            yield writer.writerow(
+                (
+                    i,
+                    item["name"],
+                    format_amount(item["amount"]),
+                    item["measurement_unit"],
+                )
+            ).encode()
+
+
+class PDFExporter(ShoppingListExporter):
+    """Minimal PDF 1.4 writer.
+
+    Uses the built-in Helvetica font with a cp1251 based encoding, so no
+    fonts are embedded and no third-party library is needed. Objects are
+    written as soon as a page is full and the cross-reference table is
+    built from the offsets counted along the way.
+    """
+
+    format = "pdf"
+    content_type = "application/pdf"
+
+    page_width = 595
+    page_height = 842
+    margin = 50
+    font_size = 11
+    leading = 14
+
+    # Glyph names of cp1251 Cyrillic letters: А-Я, а-я, Ё, ё.
+    encoding_differences = (
+        "/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding "
+        "/Differences [168 /afii10023 184 /afii10071 192 "
+        + " ".join(
+            f"/afii{code}"
+            for code in (
+                *range(10017, 10023),
+                *range(10024, 10050),
+                *range(10065, 10071),
+                *range(10072, 10098),
+            )
+        )
+        + "] >>"
+    )
+
+    @property
+    def lines_per_page(self):
+        return (self.page_height - 2 * self.margin) // self.leading
+
+    @staticmethod
+    def _escape(line):
+        encoded = line.encode("cp1251", errors="replace")
+        return (
+            encoded.replace(b"\\", b"\\\\")
+            .replace(b"(", b"\\(")
+            .replace(b")", b"\\)")
+        )
+
+    def _page_content(self, lines):
+        top = self.page_height - self.margin
+        content = [
+            f"BT /F1 {self.font_size} Tf {self.leading} TL "
+            f"{self.margin} {top} Td".encode()
+        ]
+        content.extend(b"(" + self._escape(line) + b") '" for line in lines)
+        content.append(b"ET")
+        return b"\n".join(content)
+
+    def _pages(self, shopping_list):
+        page = []
+        for line in shopping_list.lines():
+            page.append(line)
+            if len(page) == self.lines_per_page:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def render(self, shopping_list):
+        # Object numbers 1-3 are reserved for the catalog, the page tree
+        # and the font, which are only written once all pages are known.
+        catalog_id, pages_id, font_id = 1, 2, 3
+        next_id = 4
+        offsets = {}
+        page_ids = []
+        position = 0
+
+        def write_object(object_id, body):
+            offsets[object_id] = position
+            return b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        position += len(header)
+        yield header
+
+        for lines in self._pages(shopping_list):
+            content_id, page_id = next_id, next_id + 1
+            next_id += 2
+            content = self._page_content(lines)
+            chunk = write_object(
+                content_id,
+                b"<< /Length %d >>\nstream\n" % len(content)
+                + content
+                + b"\nendstream",
+            )
+            position += len(chunk)
+            yield chunk
+            chunk = write_object(
+                page_id,
+                (
+                    f"<< /Type /Page /Parent {pages_id} 0 R "
+                    f"/MediaBox [0 0 {self.page_width} {self.page_height}] "
+                    f"/Resources << /Font << /F1 {font_id} 0 R >> >> "
+                    f"/Contents {content_id} 0 R >>"
+                ).encode(),
+            )
+            position += len(chunk)
+            yield chunk
+            page_ids.append(page_id)
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+        for object_id, body in (
+            (
+                font_id,
+                "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                f"{self.encoding_differences} >>",
+            ),
+            (
+                pages_id,
+                f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>",
+            ),
+            (catalog_id, f"<< /Type /Catalog /Pages {pages_id} 0 R >>"),
+        ):
+            chunk = write_object(object_id, body.encode())
+            position += len(chunk)
+            yield chunk
+
+        xref = [b"xref\n0 %d\n" % next_id, b"0000000000 65535 f \n"]
+        xref.extend(
+            b"%010d 00000 n \n" % offsets[object_id]
+            for object_id in range(1, next_id)
+        )
+        yield b"".join(xref)
+        yield (
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (next_id, catalog_id, position)
+        )
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (TextExporter, CSVExporter, PDFExporter)
+}
+
+
+def get_exporter(export_format):
+    """Return an exporter instance for ``?format=`` value."""
+    try:
+        return EXPORTERS[export_format]()
+    except KeyError:
+        raise ValidationError(
+            {"format": f"Доступные форматы: {', '.join(EXPORTERS)}"}
+        )
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Leaves ``?format=`` to the view, which picks an exporter by it."""
+
+    def filter_renderers(self, renderers, format):
+        return renderers
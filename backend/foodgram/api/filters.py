@@ -1,16 +1,15 @@
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Recipe
 
-
-class IngredientFilter(FilterSet):
-    """Filter for Ingredient model."""
-
-    name = filters.CharFilter(field_name="name", lookup_expr="istartswith")
-
-    class Meta:
-        model = Ingredient
-        fields = ["name"]
+# ?ordering= values, each ending in a unique key for cursor pagination.
+RECIPE_ORDERINGS = {
+    "newest": ("-created", "-id"),
+    "popular": ("-favorites_count", "-id"),
+    "trending": ("-trending_score", "-id"),
+}
+DEFAULT_RECIPE_ORDERING = ("name", "id")
+SEARCH_RECIPE_ORDERING = ("-search_rank", "name", "id")
 
 
 class RecipeFilter(FilterSet):
@@ -20,10 +19,22 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
+    # Declared last, so an explicit ordering overrides the search rank.
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
-        fields = ["author", "is_favorited", "is_in_shopping_cart"]
+        fields = [
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+            "ordering",
+        ]
 
     def filter_is_favorited(self, recipes, name, value):
         current_user = self.request.user
@@ -36,3 +47,11 @@ class RecipeFilter(FilterSet):
         if current_user.is_authenticated and value:
             return recipes.filter(shoppingcarts__user=current_user)
         return recipes
+
+    def filter_search(self, recipes, name, value):
+        if not value.strip():
+            return recipes
+        return recipes.search(value).order_by(*SEARCH_RECIPE_ORDERING)
+
+    def filter_ordering(self, recipes, name, value):
+        return recipes.order_by(*RECIPE_ORDERINGS[value])
@@ -1,9 +1,295 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Q, Value
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+
+from recipes.cache import get_model_count
+
+FILTERED_COUNT_KEY = "filtered_count:{user_id}:{query_hash}"
+
+
+class CountedPaginator(Paginator):
+    """Paginator taking the object count from ``count_func``.
+
+    The count may be cached or estimated, so pages are sliced by page size
+    alone and never truncated by a stale count.
+    """
+
+    def __init__(self, object_list, per_page, count_func, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_func = count_func
+
+    @cached_property
+    def count(self):
+        return self.count_func()
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+
+class RowValueComparison(Func):
+    """``(field, ...) < (value, ...)`` comparison of SQL row values.
+
+    Unlike the equivalent OR of per-field conditions, it is a single range
+    that an index on the same columns serves directly.
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        super().__init__(*(F(name) for name in fields), *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        size = len(sqls) // 2
+        return (
+            f"({', '.join(sqls[:size])}) {self.operator} "
+            f"({', '.join(sqls[size:])})",
+            params,
+        )
+
+
+class SiteCursorPagination(CursorPagination):
+    """Keyset pagination, no COUNT(*) and no OFFSET over skipped rows.
+
+    Cursors hold the values of every ``ordering`` field of the edge row,
+    and pages continue with a row value comparison such as
+    ``(favorites_count, id) < (0, 42)``, so rows sharing the first value
+    are skipped by the index too. The last ordering field must be unique.
+    """
+
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = "-id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate(partial(self.get_rows, queryset), request)
+
+    def paginate(self, get_rows, request):
+        """Paginate what ``get_rows(position, reverse, limit)`` returns.
+
+        ``get_rows`` returns up to ``limit`` objects following
+        ``position``, a list of ordering values or None for the start,
+        in ``ordering``; or preceding it, nearest first, if ``reverse``.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        if isinstance(self.ordering, str):
+            self.ordering = (self.ordering,)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            position, reverse = None, False
+        else:
+            position, reverse = self.cursor.position, self.cursor.reverse
+
+        rows = list(get_rows(position, reverse, self.page_size + 1))
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_rows(self, queryset, position, reverse, limit):
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                name[1:] if name.startswith("-") else f"-{name}"
+                for name in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(queryset.model, ordering, position)
+            )
+        return queryset[:limit]
+
+    def get_keyset_filter(self, model, ordering, position):
+        """Condition selecting the rows after ``position`` in ``ordering``."""
+        names = [name.lstrip("-") for name in ordering]
+        values = []
+        for name, value in zip(names, position):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Annotations, e.g. search_rank.
+                values.append(Value(value))
+                continue
+            try:
+                values.append(Value(field.to_python(value), field))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        descending = {name.startswith("-") for name in ordering}
+        if len(descending) == 1:
+            return RowValueComparison(
+                names, values, "<" if descending.pop() else ">"
+            )
+        # Mixed directions, compare field by field.
+        condition = Q(pk__in=[])
+        for index, name in enumerate(names):
+            lookup = "lt" if ordering[index].startswith("-") else "gt"
+            condition |= Q(
+                **{
+                    names[previous]: values[previous]
+                    for previous in range(index)
+                },
+                **{f"{name}__{lookup}": values[index]},
+            )
+        return condition
+
+    def get_position(self, instance):
+        return [getattr(instance, name.lstrip("-")) for name in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Nothing precedes the cursor, the next page is the first one.
+            return self.encode_cursor(Cursor(0, False, None))
+        return self.encode_cursor(
+            Cursor(0, False, self.get_position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(0, True, self.get_position(self.page[0]))
+        )
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(
+                # str() keeps the microseconds of datetimes.
+                position=json.dumps(cursor.position, default=str)
+            )
+        return super().encode_cursor(cursor)
+
+    def decode_cursor(self, request):
+        # An empty ``?cursor=`` asks for the first page.
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        cursor = super().decode_cursor(request)
+        if cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
 
 
 class SitePagination(PageNumberPagination):
-    """Pagination class for recipes and users."""
+    """Pagination class for recipes and users.
+
+    Views that define ``cursor_ordering`` (an indexed, unique key) switch
+    to SiteCursorPagination when the request has a ``cursor`` parameter.
+
+    Counts avoid ``SELECT COUNT(*)`` where possible: unfiltered lists use
+    the row counter kept by recipes.signals, filtered ones are memoized
+    per user for PAGINATION_COUNT_CACHE_TIMEOUT seconds, and with
+    PAGINATION_ESTIMATE_COUNT_THRESHOLD set PostgreSQL planner estimates
+    replace counts above that threshold.
+    """
 
     page_size = 6
     page_size_query_param = "limit"
     max_page_size = 100
+    cursor_query_param = SiteCursorPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_ordering = getattr(view, "cursor_ordering", None)
+        if cursor_ordering and self.cursor_query_param in request.query_params:
+            self.cursor_paginator = SiteCursorPagination()
+            self.cursor_paginator.ordering = cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.django_paginator_class = partial(
+            CountedPaginator,
+            count_func=partial(self.get_count, queryset, request),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_count(self, queryset, request):
+        threshold = settings.PAGINATION_ESTIMATE_COUNT_THRESHOLD
+        if (
+            threshold is not None
+            and connections[queryset.db].vendor == "postgresql"
+        ):
+            estimate = self.estimate_count(queryset)
+            if estimate >= threshold:
+                return estimate
+
+        if not queryset.query.where:
+            return get_model_count(queryset.model, queryset.count)
+
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        query_hash = hashlib.md5(
+            repr((sql, params)).encode(), usedforsecurity=False
+        ).hexdigest()
+        return cache.get_or_set(
+            FILTERED_COUNT_KEY.format(
+                user_id=request.user.pk, query_hash=query_hash
+            ),
+            queryset.count,
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        )
+
+    @staticmethod
+    def estimate_count(queryset):
+        """Row estimate of the PostgreSQL planner for ``queryset``."""
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class RankedPagination(PageNumberPagination):
+    """Page number pagination of a list ranked in memory."""
+
+    page_size = SitePagination.page_size
+    page_size_query_param = SitePagination.page_size_query_param
+    max_page_size = SitePagination.max_page_size
@@ -1,17 +1,145 @@
 import base64
+import binascii
+import os
+import tempfile
+from io import BytesIO
+
 from rest_framework import serializers
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+    UploadedFile,
+)
+
+from recipes.images import variant_url
+
+# Multiple of 4, so every chunk decodes on its own.
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_SEPARATOR = ";base64,"
+
+
+def is_image_signature(header):
+    """Whether the first decoded bytes look like a supported image."""
+    return header.startswith(
+        (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+    ) or (header[:4] == b"RIFF" and header[8:12] == b"WEBP")
+
+
+class _SpilledImageFile(TemporaryUploadedFile):
+    """Temporary file removed on close unless the storage moved it.
+
+    NamedTemporaryFile can't be relied on to delete it: the file is
+    collected with the saved instance and its own finalizer may run after
+    the file was moved away.
+    """
+
+    def __init__(self, name, content_type):
+        file = tempfile.NamedTemporaryFile(
+            suffix=".upload" + os.path.splitext(name)[1],
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+            delete=False,
+        )
+        UploadedFile.__init__(self, file, name, content_type, None, None)
+
+    def close(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+    def __del__(self):
+        self.close()
 
 
 class Base64ImageField(serializers.ImageField):
+    """Image field accepting ``data:image/<ext>;base64,<data>`` strings.
+
+    The payload is decoded in chunks into memory and moved to a temporary
+    file once it outgrows FILE_UPLOAD_MAX_MEMORY_SIZE, like multipart
+    uploads are. Decoding stops as soon as the signature doesn't match an
+    image or IMAGE_UPLOAD_MAX_SIZE is exceeded.
+    """
+
+    default_error_messages = {
+        "invalid_base64": "Изображение должно быть в формате base64.",
+        "invalid_signature": "Загруженный файл не является изображением.",
+        "max_size": "Размер изображения не должен превышать {max_size} байт.",
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            if data.startswith("data:image"):
-                format, imgstr = data.split(";base64,")
-                ext = format.split("/")[-1]
-                data = ContentFile(
-                    base64.b64decode(imgstr), name="temp." + ext
-                )
-
+            data = self.decode(data)
         return super().to_internal_value(data)
+
+    def decode(self, data):
+        start = data.find(BASE64_SEPARATOR)
+        if start == -1:
+            self.fail("invalid_base64")
+        content_type = data[:start].removeprefix("data:")
+        name = "temp." + content_type.split("/")[-1]
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+
+        file = BytesIO()
+        size = 0
+        position = start + len(BASE64_SEPARATOR)
+        remainder = ""
+        while position < len(data):
+            end = position + BASE64_CHUNK_SIZE
+            # Whitespace is dropped, so a chunk may not end on a quantum.
+            chunk = remainder + "".join(data[position:end].split())
+            position = end
+            if position < len(data):
+                cut = len(chunk) - len(chunk) % 4
+                chunk, remainder = chunk[:cut], chunk[cut:]
+            try:
+                decoded = base64.b64decode(chunk, validate=True)
+            except binascii.Error:
+                self.fail("invalid_base64")
+
+            if size == 0 and not is_image_signature(decoded):
+                self.fail("invalid_signature")
+            size += len(decoded)
+            if size > max_size:
+                self.fail("max_size", max_size=max_size)
+            if (
+                isinstance(file, BytesIO)
+                and size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+            ):
+                spilled = _SpilledImageFile(name, content_type)
+                spilled.write(file.getvalue())
+                file = spilled
+            file.write(decoded)
+
+        if size == 0:
+            self.fail("invalid_base64")
+        file.seek(0)
+        if isinstance(file, BytesIO):
+            return InMemoryUploadedFile(
+                file, None, name, content_type, size, None
+            )
+        file.size = size
+        return file
+
+
+class ImageVariantField(serializers.Field):
+    """Absolute URL of a resized variant of an image field."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        if not getattr(instance, self.source):
+            return None
+        url = variant_url(instance, self.source, self.variant)
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -25,10 +25,50 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field looking objects up in ``preloaded`` when it is set.
+
+    Errors are the same as those of PrimaryKeyRelatedField.
+    """
+
+    preloaded = None
+
+    def to_internal_value(self, data):
+        if self.preloaded is None:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.preloaded[pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Loads every ingredient of the list with one query."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            ingredient_ids = set()
+            for item in data:
+                try:
+                    ingredient_ids.add(int(item["id"]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            self.child.fields["id"].preloaded = Ingredient.objects.in_bulk(
+                ingredient_ids
+            )
+        return super().to_internal_value(data)
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Serializer for writing ingredient recipes"""
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = PreloadedPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
         source="ingredient",
     )
@@ -40,3 +80,4 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
+        list_serializer_class = RecipeIngredientListSerializer
@@ -1,14 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
-from recipes.models import Recipe, RecipeIngredient
+from recipes.models import Recipe, RecipeIngredient, ShoppingListItem
+from recipes.overlay import FAVORITES, SHOPPING_CART, SUBSCRIPTIONS
 from api.serializers.users import UserProfileSerializer
 from api.serializers.ingredients import (
     RecipeIngredientReadSerializer,
     RecipeIngredientWriteSerializer,
 )
-from api.serializers.fields import Base64ImageField
+from api.serializers.fields import Base64ImageField, ImageVariantField
 
 
 User = get_user_model()
@@ -23,6 +25,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image = ImageVariantField("medium")
 
     class Meta:
         model = Recipe
@@ -36,24 +39,67 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "image",
             "text",
             "cooking_time",
+            "favorites_count",
         )
         fields = read_only_fields
 
-    def _get_exists_relation(self, recipe_obj, relation_name):
+    def _get_exists_relation(self, recipe_obj, relation_name, overlay_name):
         request = self.context.get("request")
+        if not (request and request.user.is_authenticated):
+            return False
+        # Views put the user's overlay in the context, query the relation
+        # only when serializing without it.
+        overlay = self.context.get("overlay")
+        if overlay is not None:
+            return recipe_obj.id in overlay[overlay_name]
         return (
-            request
-            and request.user.is_authenticated
-            and getattr(recipe_obj, relation_name)
+            getattr(recipe_obj, relation_name)
             .filter(user=request.user)
             .exists()
         )
 
     def get_is_favorited(self, recipe_obj):
-        return self._get_exists_relation(recipe_obj, "favoriterecipes")
+        return self._get_exists_relation(
+            recipe_obj, "favoriterecipes", FAVORITES
+        )
 
     def get_is_in_shopping_cart(self, recipe_obj):
-        return self._get_exists_relation(recipe_obj, "shoppingcarts")
+        return self._get_exists_relation(
+            recipe_obj, "shoppingcarts", SHOPPING_CART
+        )
+
+    @staticmethod
+    def apply_overlay(recipe_data, overlay):
+        """Copy of serialized recipe data with the flags of a user.
+
+        ``overlay`` is None for anonymous users, which resets the flags.
+        """
+        return {
+            **recipe_data,
+            "is_favorited": overlay is not None
+            and recipe_data["id"] in overlay[FAVORITES],
+            "is_in_shopping_cart": overlay is not None
+            and recipe_data["id"] in overlay[SHOPPING_CART],
+            "author": {
+                **recipe_data["author"],
+                "is_subscribed": overlay is not None
+                and recipe_data["author"]["id"] in overlay[SUBSCRIPTIONS],
+            },
+        }
+
+
+class RecipeMatchSerializer(RecipeReadSerializer):
+    """Recipe found by ingredients, with the share of them present."""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        read_only_fields = RecipeReadSerializer.Meta.read_only_fields + (
+            "coverage",
+            "missing_count",
+        )
+        fields = read_only_fields
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -96,6 +142,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return data
 
     def _create_recipe_ingredients(self, recipe, ingredients_data):
+        if not ingredients_data:
+            return
         RecipeIngredient.objects.bulk_create(
             [
                 RecipeIngredient(
@@ -114,12 +162,75 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self._create_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    def _update_recipe_ingredients(self, recipe, ingredients_data):
+        """Write only the rows that differ from ``ingredients_data``.
+
+        Returns the old and the new amounts by ingredient id of the rows
+        written in bulk. Deleted rows update shopping lists by signals.
+        """
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in existing.items()
+        }
+        new_amounts = {
+            ingredient_data["ingredient"].id: ingredient_data["amount"]
+            for ingredient_data in ingredients_data
+        }
+
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                pk__in=[
+                    existing[ingredient_id].pk for ingredient_id in removed
+                ]
+            ).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = existing.get(ingredient_id)
+            if (
+                recipe_ingredient is not None
+                and recipe_ingredient.amount != amount
+            ):
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        self._create_recipe_ingredients(
+            recipe,
+            [
+                ingredient_data
+                for ingredient_data in ingredients_data
+                if ingredient_data["ingredient"].id not in existing
+            ],
+        )
+        return {
+            ingredient_id: old_amounts[ingredient_id]
+            for ingredient_id in old_amounts.keys() & new_amounts.keys()
+        }, new_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop("ingredients")
-        instance.recipe_ingredients.all().delete()
-        self._create_recipe_ingredients(instance, ingredients_data)
+        old_amounts, new_amounts = self._update_recipe_ingredients(
+            instance, ingredients_data
+        )
+        ShoppingListItem.objects.change_recipe(
+            instance, old_amounts, new_amounts
+        )
         return super().update(instance, validated_data)
 
     def to_representation(self, recipe):
+        prefetch_related_objects(
+            [recipe],
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
         return RecipeReadSerializer(recipe, context=self.context).data
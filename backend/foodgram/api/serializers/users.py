@@ -2,14 +2,15 @@ from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
 from recipes.models import User, Recipe
-from api.serializers.fields import Base64ImageField
+from recipes.overlay import SUBSCRIPTIONS
+from api.serializers.fields import Base64ImageField, ImageVariantField
 
 
 class UserProfileSerializer(UserSerializer):
     """Serializer for user profile"""
 
     is_subscribed = serializers.SerializerMethodField()
-    avatar = serializers.SerializerMethodField()
+    avatar = ImageVariantField("100")
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -17,17 +18,18 @@ class UserProfileSerializer(UserSerializer):
 
     def get_is_subscribed(self, user_profile):
         request = self.context.get("request")
-        return (
-            request is not None
-            and not request.user.is_anonymous
-            and request.user.is_authenticated
-            and user_profile.followers.filter(user=request.user).exists()
-        )
-
-    def get_avatar(self, user_profile):
-        if user_profile.avatar:
-            return user_profile.avatar.url
-        return None
+        if (
+            request is None
+            or request.user.is_anonymous
+            or not request.user.is_authenticated
+        ):
+            return False
+        # Views put the user's overlay in the context to avoid a query
+        # per user.
+        overlay = self.context.get("overlay")
+        if overlay is not None:
+            return user_profile.id in overlay[SUBSCRIPTIONS]
+        return user_profile.authors.filter(user=request.user).exists()
 
 
 class UserAvatarSerializer(serializers.ModelSerializer):
@@ -52,6 +54,8 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Serializer for short recipe details."""
 
+    image = ImageVariantField("thumbnail")
+
     class Meta:
         model = Recipe
         read_only_fields = ("id", "name", "image", "cooking_time")
@@ -59,12 +63,16 @@ class RecipeShortSerializer(serializers.ModelSerializer):
 
 
 class UserWithRecipesSerializer(UserProfileSerializer):
-    """Сериализатор для пользователя с его рецептами."""
+    """Сериализатор для пользователя с его рецептами.
 
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source="recipes.count", read_only=True
+    Expects users with prefetched ``recipes_preview`` (see
+    ``UserViewSet.get_authors_with_recipes``).
+    """
+
+    recipes = RecipeShortSerializer(
+        many=True, read_only=True, source="recipes_preview"
     )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserProfileSerializer.Meta):
         fields = (
@@ -72,15 +80,3 @@ class UserWithRecipesSerializer(UserProfileSerializer):
             "recipes",
             "recipes_count",
         )
-
-    def get_recipes(self, user_obj):
-        return RecipeShortSerializer(
-            user_obj.recipes.all()[
-                : int(
-                    self.context.get("request").GET.get(
-                        "recipes_limit", 10**10
-                    )
-                )
-            ],
-            many=True,
-        ).data
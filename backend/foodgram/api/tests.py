@@ -0,0 +1,207 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    SimilarRecipe,
+    User,
+)
+
+
+class RecipeAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author",
+            email="author@example.com",
+            first_name="Автор",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.reader = User.objects.create_user(
+            username="reader",
+            email="reader@example.com",
+            first_name="Читатель",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=f"ингредиент {number}", measurement_unit="г")
+                for number in range(5)
+            ]
+        )
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f"рецепт {number:02}",
+                text="описание",
+                cooking_time=10,
+                image="recipes/images/recipe.png",
+            )
+            RecipeIngredient.objects.bulk_create(
+                [
+                    RecipeIngredient(
+                        recipe=recipe, ingredient=ingredient, amount=100
+                    )
+                    for ingredient in cls.ingredients[:3]
+                ]
+            )
+            if number % 2:
+                FavoriteRecipe.objects.create(user=cls.reader, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.reader)
+
+
+class RecipeListQueriesTest(RecipeAPITestCase):
+    def count_list_queries(self, limit):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/recipes/", {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(context.captured_queries)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        self.assertEqual(
+            self.count_list_queries(2), self.count_list_queries(12)
+        )
+
+    def test_list_flags(self):
+        response = self.client.get("/api/recipes/", {"limit": 12})
+        flags = {
+            recipe["name"]: (
+                recipe["is_favorited"],
+                recipe["is_in_shopping_cart"],
+            )
+            for recipe in response.data["results"]
+        }
+        self.assertEqual(
+            flags,
+            {
+                f"рецепт {number:02}": (bool(number % 2), bool(number % 3))
+                for number in range(12)
+            },
+        )
+
+
+class RecipeUpdateWritesTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.recipe = Recipe.objects.filter(author=self.author).first()
+
+    def count_ingredient_writes(self, ingredients):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f"/api/recipes/{self.recipe.pk}/",
+                {"name": "новое название", "ingredients": ingredients},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        writes = {}
+        for query in context.captured_queries:
+            statement = query["sql"].split(maxsplit=1)[0].upper()
+            if (
+                statement in ("INSERT", "UPDATE", "DELETE")
+                and RecipeIngredient._meta.db_table in query["sql"]
+            ):
+                writes[statement] = writes.get(statement, 0) + 1
+        return writes
+
+    def test_unchanged_ingredients_are_not_written(self):
+        self.assertEqual(
+            self.count_ingredient_writes(
+                [
+                    {"id": ingredient.pk, "amount": 100}
+                    for ingredient in self.ingredients[:3]
+                ]
+            ),
+            {},
+        )
+
+    def test_only_changed_ingredients_are_written(self):
+        self.assertEqual(
+            self.count_ingredient_writes(
+                [
+                    {"id": self.ingredients[0].pk, "amount": 100},
+                    {"id": self.ingredients[1].pk, "amount": 250},
+                    {"id": self.ingredients[3].pk, "amount": 5},
+                    {"id": self.ingredients[4].pk, "amount": 7},
+                ]
+            ),
+            {"INSERT": 1, "UPDATE": 1, "DELETE": 1},
+        )
+        self.assertEqual(
+            dict(
+                self.recipe.recipe_ingredients.values_list(
+                    "ingredient_id", "amount"
+                )
+            ),
+            {
+                self.ingredients[0].pk: 100,
+                self.ingredients[1].pk: 250,
+                self.ingredients[3].pk: 5,
+                self.ingredients[4].pk: 7,
+            },
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN output of PostgreSQL")
+class IndexUsageTest(RecipeAPITestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            # Test tables are tiny, sequential scans would win otherwise.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_recipe_list(self):
+        self.assertUsesIndex(
+            Recipe.objects.order_by("name", "id")[:6], "recipe_name_id_idx"
+        )
+
+    def test_popular_recipes(self):
+        self.assertUsesIndex(
+            Recipe.objects.order_by("-favorites_count", "-id")[:6],
+            "recipe_favorites_count_id_idx",
+        )
+
+    def test_author_recipes(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.author).order_by("name", "id")[
+                :3
+            ],
+            "recipe_author_name_id_idx",
+        )
+
+    def test_recipe_ingredients(self):
+        self.assertUsesIndex(
+            RecipeIngredient.objects.filter(
+                recipe__in=Recipe.objects.order_by("name", "id")[:6]
+            ),
+            "recipeingredient_recipe_idx",
+        )
+
+    def test_user_favorites(self):
+        self.assertUsesIndex(
+            FavoriteRecipe.objects.filter(user=self.reader),
+            "unique_favoriterecipe",
+        )
+
+    def test_similar_recipes(self):
+        self.assertUsesIndex(
+            SimilarRecipe.objects.filter(recipe=Recipe.objects.first()),
+            "similarrecipe_recipe_score_idx",
+        )
@@ -1,16 +1,45 @@
-from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
-from api.filters import IngredientFilter
 from api.serializers.ingredients import IngredientSerializer
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filterset_class = IngredientFilter
-    filter_backends = [DjangoFilterBackend]
     permission_classes = [AllowAny]
     pagination_class = None
+
+    def get_limit(self):
+        """Validated ``limit`` query parameter or None."""
+        limit = self.request.query_params.get("limit")
+        if limit is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=1).run_validation(limit)
+        except ValidationError as error:
+            raise ValidationError({"limit": error.detail})
+
+    def list(self, request, *args, **kwargs):
+        """Prefix search by ``name`` served from the in-process index."""
+        limit = self.get_limit()
+        index = ingredient_index.get()
+        etag = quote_etag(index.version)
+        last_modified = int(index.modified)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(
+                index.search(request.query_params.get("name", ""), limit)
+            )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
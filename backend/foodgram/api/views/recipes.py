@@ -1,43 +1,263 @@
-from datetime import datetime
+import hashlib
+from functools import partial
+
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import action
-from django.http import Http404, FileResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.urls import reverse
+from django.utils.http import quote_etag, urlencode
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 
 
-from recipes.models import Recipe, FavoriteRecipe, ShoppingCart
+from recipes.cache import (
+    get_recipe_list_version,
+    get_recipe_version,
+    get_shopping_list_version,
+)
+from recipes.models import (
+    Recipe,
+    RecipeIngredient,
+    FavoriteRecipe,
+    ShoppingCart,
+    ShoppingListItem,
+    SimilarRecipe,
+    TimelineEntry,
+)
+from recipes.overlay import get_user_overlay
+from recipes.recipe_index import recipe_index
 from api.serializers.recipes import (
+    RecipeMatchSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
 )
 from api.serializers.users import RecipeShortSerializer
 from api.permissions import IsAuthorOrReadOnly
-from api.pagination import SitePagination
-from api.filters import RecipeFilter
+from api.pagination import (
+    RankedPagination,
+    SiteCursorPagination,
+    SitePagination,
+)
+from api.filters import (
+    DEFAULT_RECIPE_ORDERING,
+    RECIPE_ORDERINGS,
+    SEARCH_RECIPE_ORDERING,
+    RecipeFilter,
+)
+from api.exporters import (
+    ExportContentNegotiation,
+    ShoppingList,
+    get_exporter,
+)
+
+# Filters whose results depend on the current user.
+USER_FILTER_PARAMS = ("is_favorited", "is_in_shopping_cart")
+RECIPE_RESPONSE_CACHE_KEY = "recipe_response:{version}:{request_hash}"
+SHOPPING_LIST_CACHE_KEY = "shopping_list:{user_id}:{version}:{format}"
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.select_related("author").prefetch_related(
+        Prefetch(
+            "recipe_ingredients",
+            queryset=RecipeIngredient.objects.select_related("ingredient"),
+        )
+    )
     filter_backends = [DjangoFilterBackend]
     pagination_class = SitePagination
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly,)
 
+    @property
+    def cursor_ordering(self):
+        """Ordering of the list as RecipeFilter sorts it."""
+        query_params = self.request.query_params
+        if query_params.get("ordering") in RECIPE_ORDERINGS:
+            return RECIPE_ORDERINGS[query_params["ordering"]]
+        if query_params.get("search", "").strip():
+            return SEARCH_RECIPE_ORDERING
+        return DEFAULT_RECIPE_ORDERING
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context["overlay"] = get_user_overlay(self.request.user.id)
+        return context
+
+    def _get_cached(self, request, version, view, *args, **kwargs):
+        """Serve the view from the shared response cache.
+
+        Response data is cached without user-specific flags under
+        ``version``, which recipes.signals reset when the recipes, their
+        ingredients or authors change. Authenticated users get the shared
+        data patched with their overlay.
+        """
+        overlay = None
+        if request.user.is_authenticated:
+            overlay = get_user_overlay(request.user.id)
+        if overlay is not None and any(
+            name in request.query_params for name in USER_FILTER_PARAMS
+        ):
+            return view(request, *args, **kwargs)
+
+        cache_key = RECIPE_RESPONSE_CACHE_KEY.format(
+            version=version,
+            request_hash=hashlib.md5(
+                "{}{}?{}".format(
+                    request.get_host(),
+                    request.path,
+                    urlencode(sorted(request.query_params.lists()), True),
+                ).encode(),
+                usedforsecurity=False,
+            ).hexdigest(),
+        )
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(self._apply_overlay(data, overlay))
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(
+                cache_key,
+                self._apply_overlay(response.data, None),
+                settings.RECIPE_RESPONSE_CACHE_TIMEOUT,
+            )
+        return response
+
+    @staticmethod
+    def _apply_overlay(data, overlay):
+        if "results" not in data:
+            return RecipeReadSerializer.apply_overlay(data, overlay)
+        return {
+            **data,
+            "results": [
+                RecipeReadSerializer.apply_overlay(recipe_data, overlay)
+                for recipe_data in data["results"]
+            ],
+        }
+
+    def list(self, request, *args, **kwargs):
+        return self._get_cached(
+            request, get_recipe_list_version(), super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not str(kwargs["pk"]).isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        return self._get_cached(
+            request,
+            get_recipe_version(int(kwargs["pk"])),
+            super().retrieve,
+            *args,
+            **kwargs,
+        )
+
     def get_serializer_class(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "feed"]:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=SiteCursorPagination,
+    )
+    def feed(self, request):
+        """Recipes of followed authors, newest first."""
+        recipes = self.paginator.paginate(
+            partial(self._get_feed_page, request.user), request
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def _get_feed_page(self, user, position, reverse, limit):
+        if position is not None and type(position[0]) is not int:
+            raise NotFound(self.paginator.invalid_cursor_message)
+        recipe_ids = TimelineEntry.objects.feed_ids(
+            user,
+            limit,
+            after=None if position is None else position[0],
+            reverse=reverse,
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        # Skip entries whose recipes were deleted meanwhile.
+        return [
+            recipes[recipe_id]
+            for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+
+    @action(detail=False, pagination_class=RankedPagination)
+    def cookable(self, request):
+        """Recipes with the ``ingredients`` a user has, best covered first.
+
+        Ingredient ids are comma separated or repeated. Recipes are ranked
+        by the in-process index, only the page is read from the database.
+        """
+        ingredient_ids = serializers.ListField(
+            child=serializers.IntegerField(min_value=1), allow_empty=False
+        )
+        try:
+            ingredient_ids = ingredient_ids.run_validation(
+                [
+                    ingredient_id
+                    for value in request.query_params.getlist("ingredients")
+                    for ingredient_id in value.split(",")
+                    if ingredient_id
+                ]
+            )
+        except ValidationError as error:
+            raise ValidationError({"ingredients": error.detail})
+
+        matches = self.paginate_queryset(
+            recipe_index.get().match(ingredient_ids)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        page = []
+        for recipe_id, matched, total in matches:
+            # Skip recipes deleted since the index was updated.
+            if recipe_id in recipes:
+                recipe = recipes[recipe_id]
+                recipe.coverage = round(matched / total, 3)
+                recipe.missing_count = total - matched
+                page.append(recipe)
+        serializer = RecipeMatchSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Recipes with the most similar ingredients, most similar first.
+
+        Neighbours are precomputed by the compute_similar_recipes command.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        neighbours = SimilarRecipe.objects.filter(recipe_id=pk).select_related(
+            "similar"
+        )
+        if not neighbours and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(
+            RecipeShortSerializer(
+                [neighbour.similar for neighbour in neighbours], many=True
+            ).data
+        )
+
     @action(methods=["get"], detail=True, url_path="get-link")
     def get_link_to_recipe(self, request, pk):
         if not Recipe.objects.filter(pk=pk).exists():
@@ -96,54 +316,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
     @action(
-        detail=False, permission_classes=[IsAuthenticated], methods=["get"]
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        methods=["get"],
+        content_negotiation_class=ExportContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        recipes = Recipe.objects.filter(shoppingcarts__user=request.user)
-
-        if not recipes.exists():
-            raise ValidationError({"errors": "Список покупок пуст"})
-
-        ingredients = (
-            recipes.values(
-                "ingredients__name", "ingredients__measurement_unit"
-            )
-            .annotate(total_amount=Sum("recipe_ingredients__amount"))
-            .order_by("ingredients__name")
+        exporter = get_exporter(request.query_params.get("format", "txt"))
+        cache_key = SHOPPING_LIST_CACHE_KEY.format(
+            user_id=request.user.id,
+            version=get_shopping_list_version(request.user.id),
+            format=exporter.format,
         )
+        headers = {
+            "Content-Disposition": (
+                f'attachment; filename="{exporter.filename}"'
+            ),
+        }
 
-        current_date = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        shopping_list = [
-            "Фудграм - Список покупок",
-            f"Дата: {current_date} UTC",
-            f"Пользователь: {request.user.username}",
-            "",
-            "Ингредиенты:",
-        ]
-
-        for i, ingredient in enumerate(ingredients, 1):
-            shopping_list.append(
-                f"{i}. {ingredient['ingredients__name'].title()} - "
-                f"{ingredient['total_amount']} "
-                f"{ingredient['ingredients__measurement_unit']}"
-            )
-
-        shopping_list.append("")
-        shopping_list.append("Рецепты:")
+        cached = cache.get(cache_key)
+        if cached is not None:
+            etag, content = cached
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = HttpResponse(
+                    content,
+                    content_type=exporter.content_type,
+                    headers=headers,
+                )
+                response["Content-Length"] = len(content)
+            response["ETag"] = etag
+            return response
 
-        for recipe in recipes:
-            shopping_list.append(
-                f"- {recipe.name} (автор: {recipe.author.get_full_name()})"
-            )
+        if not ShoppingListItem.objects.filter(user=request.user).exists():
+            raise ValidationError({"errors": "Список покупок пуст"})
 
-        shopping_list.append("")
-        shopping_list.append(
-            f"Фудграм - Ваш кулинарный помощник © {datetime.now().year}"
+        shopping_list = ShoppingList(
+            request.user,
+            ingredients=ShoppingListItem.objects.canonical_totals(
+                request.user
+            ).iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE),
+            recipes=Recipe.objects.filter(shoppingcarts__user=request.user)
+            .select_related("author")
+            .iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE),
         )
-
-        return FileResponse(
-            ("\n".join(shopping_list)),
-            as_attachment=True,
-            filename="shopping_list.txt",
-            content_type="text/plain; charset=utf-8",
+        return StreamingHttpResponse(
+            self._cache_stream(exporter.render(shopping_list), cache_key),
+            content_type=exporter.content_type,
+            headers=headers,
         )
+
+    @staticmethod
+    def _cache_stream(chunks, cache_key):
+        """Pass chunks through, caching the document if it is small."""
+        content = bytearray()
+        for chunk in chunks:
+            if content is not None:
+                content += chunk
+                if len(content) > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                    content = None
+            yield chunk
+        if content is not None:
+            content = bytes(content)
+            cache.set(
+                cache_key,
+                (quote_etag(hashlib.md5(content).hexdigest()), content),
+                settings.SHOPPING_LIST_CACHE_TIMEOUT,
+            )
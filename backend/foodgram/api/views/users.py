@@ -1,8 +1,10 @@
 from djoser.views import UserViewSet as DjoserUserViewSet
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 
@@ -12,7 +14,8 @@ from api.serializers.users import (
     UserAvatarSerializer,
     UserWithRecipesSerializer,
 )
-from recipes.models import User, Subscription
+from recipes.models import Recipe, User, Subscription
+from recipes.overlay import get_user_overlay
 
 
 class UserViewSet(DjoserUserViewSet):
@@ -20,9 +23,48 @@ class UserViewSet(DjoserUserViewSet):
 
     queryset = User.objects.all()
     pagination_class = SitePagination
+    cursor_ordering = None
     serializer_class = UserProfileSerializer
     permission_classes = [AllowAny]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context["overlay"] = get_user_overlay(self.request.user.id)
+        return context
+
+    def get_recipes_limit(self):
+        """Validated ``recipes_limit`` query parameter or None."""
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=0).run_validation(
+                recipes_limit
+            )
+        except ValidationError as error:
+            raise ValidationError({"recipes_limit": error.detail})
+
+    def get_authors_with_recipes(self, authors):
+        """Prefetch recipe previews for UserWithRecipesSerializer.
+
+        Recipe previews are limited per author in the database with
+        ROW_NUMBER() so that prolific authors don't load every recipe.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=(F("name"), F("id")),
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return authors.prefetch_related(
+            Prefetch("recipes", queryset=recipes, to_attr="recipes_preview")
+        )
+
     @action(
         detail=False, methods=["get"], permission_classes=[IsAuthenticated]
     )
@@ -62,12 +104,13 @@ class UserViewSet(DjoserUserViewSet):
         permission_classes=[IsAuthenticated],
         serializer_class=UserWithRecipesSerializer,
         pagination_class=SitePagination,
+        cursor_ordering=("username",),
     )
     def subscriptions(self, request):
         """Returns users that current user is subscribed to."""
-        subscribed_users = User.objects.filter(
-            authors__user=request.user
-        ).prefetch_related("recipes")
+        subscribed_users = self.get_authors_with_recipes(
+            User.objects.filter(authors__user=request.user)
+        )
 
         paginated_users = self.paginate_queryset(subscribed_users)
         serializer = self.get_serializer(paginated_users, many=True)
@@ -88,6 +131,10 @@ class UserViewSet(DjoserUserViewSet):
             if current_user == author:
                 raise ValidationError("Cannot subscribe to yourself")
 
+            authors = self.get_authors_with_recipes(
+                User.objects.filter(pk=author.pk)
+            )
+
             subscription, created = Subscription.objects.get_or_create(
                 user=current_user, author=author
             )
@@ -97,7 +144,7 @@ class UserViewSet(DjoserUserViewSet):
                     "You are already subscribed to this user"
                 )
 
-            serializer = self.get_serializer(author)
+            serializer = self.get_serializer(authors.get())
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         get_object_or_404(
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -72,6 +73,41 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
     }
 }
+# DB_ENGINE=django.db.backends.sqlite3 uses a local file instead, e.g. to
+# run the tests without a PostgreSQL server.
+if os.getenv("DB_ENGINE") == "django.db.backends.sqlite3":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory by default, e.g. FileBasedCache or RedisCache in production.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND")
+        or "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+# Local memory, file and database caches drop a third of their entries
+# once they hold MAX_ENTRIES (300 unless set). Expect about 3 entries per
+# active user (favorites overlay, shopping list version and document),
+# 2 per recipe viewed (version and response) and 1 per distinct list
+# query within RECIPE_RESPONSE_CACHE_TIMEOUT. FileBasedCache lists the
+# whole directory when culling, large catalogues are better served by
+# RedisCache, which evicts by its maxmemory setting instead.
+if CACHES["default"]["BACKEND"] in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.db.DatabaseCache",
+):
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES") or 20000),
+    }
 
 
 # Password validation
@@ -114,6 +150,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Threads rendering image variants, 0 renders them in the request
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", 2))
+
+# Maximum decoded size of base64 encoded images
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv("IMAGE_UPLOAD_MAX_SIZE", 5 * 1024 * 1024)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -140,3 +184,45 @@ DJOSER = {
 }
 
 AUTH_USER_MODEL = "recipes.User"
+
+# Response cache of anonymous recipe list and detail requests. Favorites
+# don't invalidate it, so favorites_count may lag by up to the timeout.
+RECIPE_RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+# Trending recipes: favorites of the last TRENDING_WINDOW, each losing
+# half of its weight every TRENDING_HALF_LIFE
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_HALF_LIFE = timedelta(days=1)
+
+# Following feed. Recipes of authors with more followers are read from
+# Recipe instead of being copied to every follower's timeline.
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+FEED_FANOUT_BATCH_SIZE = 1000
+# Recent recipes of an author added to the timeline on subscription
+FEED_BACKFILL_SIZE = 100
+# Entries kept per timeline by the trim_timelines command
+FEED_TIMELINE_SIZE = 1000
+
+# In-process ingredient to recipes index: processes apply up to
+# RECIPE_INDEX_MAX_CHANGES logged recipe changes and rebuild it otherwise.
+# trim_recipe_index_changes keeps RECIPE_INDEX_CHANGE_RETENTION seconds.
+RECIPE_INDEX_MAX_CHANGES = 1000
+RECIPE_INDEX_CHANGE_RETENTION = 60 * 60 * 24
+
+# Neighbours per recipe stored by compute_similar_recipes
+SIMILAR_RECIPES_COUNT = 10
+
+# Per-user favorites, shopping cart and subscriptions ids
+USER_OVERLAY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Pagination counts. Unfiltered counts are adjusted in place only by
+# caches with an atomic incr(), and are recounted after
+# MODEL_COUNT_CACHE_TIMEOUT seconds in any case.
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+MODEL_COUNT_CACHE_TIMEOUT = 60 * 60
+PAGINATION_ESTIMATE_COUNT_THRESHOLD = None
+
+# Shopping list export
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 15
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
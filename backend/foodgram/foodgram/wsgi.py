@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
 
 application = get_wsgi_application()
+
+# Load the in-process recipe index before the first request needs it.
+from recipes.recipe_index import recipe_index  # noqa: E402
+
+recipe_index.warm()
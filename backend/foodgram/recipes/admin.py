@@ -1,7 +1,9 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.safestring import mark_safe
 from django.contrib.auth.admin import UserAdmin
 
+from .images import variant_url
 from .models import (
     User,
     Subscription,
@@ -10,15 +12,23 @@ from .models import (
     RecipeIngredient,
     FavoriteRecipe,
     ShoppingCart,
+    ShoppingListItem,
 )
 
 
 class RecipesCountMixin:
     """Mixin providing recipes count functionality"""
 
-    @admin.display(description="рецепты")
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(recipes_total=Count("recipes"))
+        )
+
+    @admin.display(description="рецепты", ordering="recipes_total")
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_total
 
 
 class BaseHasFilter(admin.SimpleListFilter):
@@ -70,7 +80,7 @@ class HasSubscriptionsFilter(BaseHasFilter):
 
 
 @admin.register(User)
-class SiteUserAdmin(UserAdmin, RecipesCountMixin):
+class SiteUserAdmin(UserAdmin):
     """Custom user admin class"""
 
     list_display = (
@@ -79,9 +89,9 @@ class SiteUserAdmin(UserAdmin, RecipesCountMixin):
         "get_full_name",
         "email",
         "get_avatar",
-        "get_recipes_count",
-        "get_number_of_following",
-        "get_number_of_followers",
+        "recipes_count",
+        "following_count",
+        "followers_count",
     )
     list_filter = (
         HasRecipesFilter,
@@ -138,17 +148,12 @@ class SiteUserAdmin(UserAdmin, RecipesCountMixin):
     @mark_safe
     def get_avatar(self, obj):
         if obj.avatar:
-            return f'<img src="{obj.avatar.url}" width="50" height="50" />'
+            return (
+                f'<img src="{variant_url(obj, "avatar", "50")}" '
+                'width="50" height="50" />'
+            )
         return ""
 
-    @admin.display(description="подписчики")
-    def get_number_of_followers(self, user_obj):
-        return user_obj.authors.count()
-
-    @admin.display(description="подписки")
-    def get_number_of_following(self, user_obj):
-        return user_obj.followers.count()
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -230,7 +235,7 @@ class RecipeAdmin(admin.ModelAdmin):
         "name",
         "cooking_time",
         "author",
-        "get_favorites_count",
+        "favorites_count",
         "get_ingredients",
         "get_image",
     )
@@ -243,10 +248,6 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = (CookingTimeFilter, "author")
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description="в избранном")
-    def get_favorites_count(self, obj):
-        return obj.favoriterecipes.count()
-
     @admin.display(description="ингредиенты")
     @mark_safe
     def get_ingredients(self, obj):
@@ -263,15 +264,23 @@ class RecipeAdmin(admin.ModelAdmin):
     @mark_safe
     def get_image(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" width="100">'
+            return (
+                f'<img src="{variant_url(obj, "image", "thumbnail")}" '
+                'width="100">'
+            )
         return "Нет изображения"
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin, RecipesCountMixin):
+class IngredientAdmin(RecipesCountMixin, admin.ModelAdmin):
     """Ingredient admin model"""
 
-    list_display = ("name", "measurement_unit", "get_recipes_count")
+    list_display = (
+        "name",
+        "measurement_unit",
+        "density",
+        "get_recipes_count",
+    )
     search_fields = ("name", "measurement_unit")
     list_filter = ("measurement_unit",)
 
@@ -283,3 +292,13 @@ class UserRecipeRelationAdmin(admin.ModelAdmin):
     list_display = ("user", "recipe")
     search_fields = ("user__username", "recipe__name")
     list_filter = ("user", "recipe")
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """Admin model for aggregated shopping lists"""
+
+    list_display = ("user", "ingredient", "total_amount")
+    list_select_related = ("user", "ingredient")
+    search_fields = ("user__username", "ingredient__name")
+    list_filter = ("user",)
@@ -0,0 +1,118 @@
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+
+SHOPPING_LIST_VERSION_KEY = "shopping_list_version:{user_id}"
+
+
+def has_atomic_incr():
+    """Whether concurrent cache.incr() calls can't lose increments.
+
+    Other backends, e.g. FileBasedCache, read the value and write it back.
+    LocMemCache is atomic within the process holding the cache.
+    """
+    return isinstance(
+        caches[DEFAULT_CACHE_ALIAS],
+        (RedisCache, BaseMemcachedCache, LocMemCache),
+    )
+
+
+def get_shopping_list_version(user_id):
+    """Current cache version of the user's shopping list."""
+    return cache.get_or_set(
+        SHOPPING_LIST_VERSION_KEY.format(user_id=user_id),
+        uuid4().hex,
+        timeout=None,
+    )
+
+
+def invalidate_shopping_lists(user_ids):
+    """Drop cached shopping list documents of the given users."""
+    cache.delete_many(
+        [
+            SHOPPING_LIST_VERSION_KEY.format(user_id=user_id)
+            for user_id in user_ids
+        ]
+    )
+
+
+INGREDIENT_INDEX_VERSION_KEY = "ingredient_index_version"
+
+
+def get_ingredient_index_version():
+    """``(version, modified timestamp)`` of the ingredient catalogue."""
+    return cache.get_or_set(
+        INGREDIENT_INDEX_VERSION_KEY, (uuid4().hex, time.time()), None
+    )
+
+
+def invalidate_ingredient_index():
+    """Make every process reload its ingredient index on next use."""
+    cache.set(INGREDIENT_INDEX_VERSION_KEY, (uuid4().hex, time.time()), None)
+
+
+MODEL_COUNT_KEY = "model_count:{label}"
+
+
+def get_model_count(model, default):
+    """Cached number of ``model`` rows, ``default()`` counts on a miss."""
+    return cache.get_or_set(
+        MODEL_COUNT_KEY.format(label=model._meta.label_lower),
+        default,
+        settings.MODEL_COUNT_CACHE_TIMEOUT,
+    )
+
+
+def change_model_count(model, delta):
+    """Adjust the cached row count, if it has been computed already.
+
+    Without an atomic incr() the count is dropped and recounted instead.
+    """
+    if not has_atomic_incr():
+        invalidate_model_count(model)
+        return
+    try:
+        cache.incr(
+            MODEL_COUNT_KEY.format(label=model._meta.label_lower), delta
+        )
+    except ValueError:
+        pass
+
+
+def invalidate_model_count(model):
+    """Recount ``model`` rows on next use, e.g. after bulk operations."""
+    cache.delete(MODEL_COUNT_KEY.format(label=model._meta.label_lower))
+
+
+RECIPE_LIST_VERSION_KEY = "recipe_list_version"
+RECIPE_VERSION_KEY = "recipe_version:{recipe_id}"
+
+
+def get_recipe_list_version():
+    """Cache version of every recipe list page."""
+    return cache.get_or_set(RECIPE_LIST_VERSION_KEY, uuid4().hex, None)
+
+
+def get_recipe_version(recipe_id):
+    """Cache version of a single recipe."""
+    return cache.get_or_set(
+        RECIPE_VERSION_KEY.format(recipe_id=recipe_id), uuid4().hex, None
+    )
+
+
+def invalidate_recipes(recipe_ids):
+    """Drop cached responses of the recipes and of all recipe lists."""
+    cache.delete_many(
+        [
+            RECIPE_LIST_VERSION_KEY,
+            *(
+                RECIPE_VERSION_KEY.format(recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            ),
+        ]
+    )
@@ -0,0 +1,72 @@
+"""Denormalized counters of recipes and users.
+
+Signals in recipes.signals adjust them with F() expressions in the
+transaction that adds or deletes the counted row. Bulk operations that
+bypass signals, and drift in general, are fixed by recount().
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import FavoriteRecipe, Recipe, Subscription, User
+
+# model: {counter field: (counted model, field pointing to the object)}
+COUNTERS = {
+    Recipe: {
+        "favorites_count": (FavoriteRecipe, "recipe"),
+    },
+    User: {
+        "recipes_count": (Recipe, "author"),
+        "followers_count": (Subscription, "author"),
+        "following_count": (Subscription, "user"),
+    },
+}
+
+
+def change_counter(model, pk, field_name, delta):
+    """Add ``delta`` to a counter without reading it first."""
+    model.objects.filter(pk=pk).update(
+        **{field_name: Greatest(F(field_name) + delta, 0)}
+    )
+
+
+def _actual_count(counted_model, field_name):
+    return Coalesce(
+        Subquery(
+            counted_model.objects.filter(**{field_name: OuterRef("pk")})
+            .order_by()
+            .values(field_name)
+            .annotate(count=Count("*"))
+            .values("count")
+        ),
+        Value(0),
+    )
+
+
+def recount(model, pks=None, check=False):
+    """Fix counters of ``model`` rows, all of them when ``pks`` is None.
+
+    Returns the number of rows whose counters were wrong. With
+    ``check`` the rows are only counted, not updated.
+    """
+    counters = COUNTERS[model]
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    actual = {
+        field_name: _actual_count(*counted)
+        for field_name, counted in counters.items()
+    }
+    drifted = queryset.alias(
+        **{f"actual_{name}": value for name, value in actual.items()}
+    ).filter(
+        ~Q(
+            *(
+                Q(**{field_name: F(f"actual_{field_name}")})
+                for field_name in counters
+            )
+        )
+    )
+    if check:
+        return drifted.count()
+    return drifted.update(**actual)
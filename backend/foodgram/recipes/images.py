@@ -0,0 +1,149 @@
+"""Background pipeline producing resized variants of uploaded images.
+
+Originals are validated in the request by the serializers. After the
+upload is committed the variants are rendered by a thread pool, so the
+gunicorn worker doesn't wait for resizing, and their names are stored in
+``<field>_variants`` together with the name of the source image.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .cache import invalidate_recipes
+
+logger = logging.getLogger(__name__)
+
+# Variant name: (width, height, crop to the exact size).
+IMAGE_VARIANTS = {
+    "recipes.recipe": {
+        "image": {
+            "thumbnail": (300, 300, False),
+            "medium": (800, 800, False),
+        },
+    },
+    "recipes.user": {
+        "avatar": {
+            "50": (50, 50, True),
+            "100": (100, 100, True),
+        },
+    },
+}
+VARIANT_FORMAT = "WEBP"
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PIPELINE_WORKERS,
+            thread_name_prefix="image-pipeline",
+        )
+    return _executor
+
+
+def variant_url(instance, field_name, variant):
+    """URL of an image variant, of the original until it is rendered."""
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants")
+    if variants.get("source") == image.name and variant in variants:
+        return image.storage.url(variants[variant])
+    return image.url
+
+
+def needs_variants(instance, field_name):
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants")
+    return bool(image) and variants.get("source") != image.name
+
+
+def render_variant(image, width, height, crop):
+    """Resize a decoded image and encode it in VARIANT_FORMAT."""
+    if crop:
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, VARIANT_FORMAT, quality=85)
+    return buffer.getvalue()
+
+
+def generate_variants(model_label, pk, field_name):
+    """Render and store every variant of ``field_name`` of one object."""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_variants(instance, field_name):
+        return
+    image_file = getattr(instance, field_name)
+    with image_file.open("rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    basename, _ = os.path.splitext(os.path.basename(image_file.name))
+    variants = {"source": image_file.name}
+    for variant, size in IMAGE_VARIANTS[model_label][field_name].items():
+        variants[variant] = image_file.storage.save(
+            os.path.join(
+                image_file.field.upload_to,
+                "variants",
+                f"{basename}_{variant}.{VARIANT_FORMAT.lower()}",
+            ),
+            ContentFile(render_variant(image, *size)),
+        )
+
+    # The image may have been replaced while the variants were rendered.
+    updated = model.objects.filter(
+        pk=pk, **{field_name: image_file.name}
+    ).update(**{f"{field_name}_variants": variants})
+    if updated:
+        if model_label == "recipes.recipe":
+            invalidate_recipes([pk])
+        else:
+            invalidate_recipes(
+                apps.get_model("recipes.recipe")
+                .objects.filter(author_id=pk)
+                .values_list("id", flat=True)
+            )
+
+
+def _render(model_label, pk, field_name):
+    try:
+        generate_variants(model_label, pk, field_name)
+    except Exception:
+        logger.exception(
+            "Failed to render %s variants of %s %s",
+            field_name,
+            model_label,
+            pk,
+        )
+
+
+def _run(model_label, pk, field_name):
+    try:
+        _render(model_label, pk, field_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(instance, field_name):
+    """Render variants in the background once the transaction commits.
+
+    With IMAGE_PIPELINE_WORKERS = 0 they are rendered synchronously.
+    """
+    args = (instance._meta.label_lower, instance.pk, field_name)
+    if settings.IMAGE_PIPELINE_WORKERS:
+        transaction.on_commit(lambda: _get_executor().submit(_run, *args))
+    else:
+        transaction.on_commit(lambda: _render(*args))
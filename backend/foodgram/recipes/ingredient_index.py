@@ -0,0 +1,62 @@
+"""Per-process ingredient index for the recipe form autocomplete.
+
+The catalogue is loaded lazily into a list sorted by lowercased name, so
+prefix lookups are a bisect instead of a database query. It is reloaded
+when the version in the cache is bumped by Ingredient changes.
+"""
+
+import threading
+from bisect import bisect_left
+
+from .cache import get_ingredient_index_version
+from .models import Ingredient
+
+
+class IngredientIndexSnapshot:
+    """Immutable state of the index for one catalogue version."""
+
+    def __init__(self, version, modified, ingredients):
+        self.version = version
+        self.modified = modified
+        self.ingredients = sorted(
+            ingredients, key=lambda item: (item["name"].lower(), item["id"])
+        )
+        self.keys = [item["name"].lower() for item in self.ingredients]
+
+    def search(self, prefix="", limit=None):
+        """Ingredients whose name starts with ``prefix``, case-insensitive."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = start
+        stop = len(self.keys)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        while end < stop and self.keys[end].startswith(prefix):
+            end += 1
+        return self.ingredients[start:end]
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def get(self):
+        """Return an up to date snapshot, loading it if needed."""
+        version, modified = get_ingredient_index_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = IngredientIndexSnapshot(
+                    version,
+                    modified,
+                    Ingredient.objects.values(
+                        "id", "name", "measurement_unit"
+                    ),
+                )
+            return self._snapshot
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,89 @@
+import posixpath
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import IMAGE_VARIANTS
+from recipes.models import Recipe, User
+from recipes.storage import content_addressed_storage
+
+
+class Command(BaseCommand):
+    help = "Delete media files that no recipe or user refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report unreferenced files, don't delete them",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help=(
+                "Keep files modified less than this many seconds ago, "
+                "their objects may not be committed yet"
+            ),
+        )
+
+    def get_references(self):
+        references = Counter()
+        for model in (Recipe, User):
+            for field_name in IMAGE_VARIANTS[model._meta.label_lower]:
+                for name, variants in model.objects.exclude(
+                    **{field_name: ""}
+                ).values_list(field_name, f"{field_name}_variants"):
+                    if name:
+                        references[name] += 1
+                    references.update(
+                        variant_name
+                        for variant, variant_name in variants.items()
+                        if variant != "source"
+                    )
+        return references
+
+    def walk(self, directory):
+        directories, files = content_addressed_storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from self.walk(posixpath.join(directory, name))
+
+    def handle(self, *args, **options):
+        # Listed before the references are read, so files saved in the
+        # meantime are not considered.
+        stored = [
+            name
+            for field in (
+                Recipe._meta.get_field("image"),
+                User._meta.get_field("avatar"),
+            )
+            if content_addressed_storage.exists(field.upload_to)
+            for name in self.walk(field.upload_to.rstrip("/"))
+        ]
+        references = self.get_references()
+        oldest = time.time() - options["min_age"]
+
+        orphans = [
+            name
+            for name in stored
+            if name not in references
+            and content_addressed_storage.get_modified_time(name).timestamp()
+            < oldest
+        ]
+        freed = sum(content_addressed_storage.size(name) for name in orphans)
+        if not options["dry_run"]:
+            for name in orphans:
+                content_addressed_storage.purge(name)
+
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(stored)} files, {len(references)} referenced "
+                f"({shared} shared); "
+                f"{'found' if options['dry_run'] else 'deleted'} "
+                f"{len(orphans)} unreferenced files, {freed} bytes"
+            )
+        )
@@ -0,0 +1,205 @@
+import heapq
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+from recipes.recipe_index import ID_TYPECODE, contains
+
+LOAD_CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the most similar recipes of every recipe by "
+        "ingredients for /api/recipes/{id}/similar/. Meant to be run "
+        "periodically, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--metric",
+            choices=("cosine", "jaccard"),
+            default="cosine",
+            help="Similarity of ingredient sets, cosine by default",
+        )
+        parser.add_argument(
+            "--no-idf",
+            action="store_true",
+            help="Weigh all ingredients equally instead of by rarity",
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=settings.SIMILAR_RECIPES_COUNT,
+            help="Number of neighbours stored per recipe",
+        )
+        parser.add_argument(
+            "--max-df",
+            type=float,
+            default=0.02,
+            help=(
+                "Ingredients in a larger share of recipes, like salt, "
+                "only add to the scores of candidates sharing a rarer one"
+            ),
+        )
+        parser.add_argument(
+            "--max-candidates",
+            type=int,
+            default=2000,
+            help=(
+                "Candidates taken from the recipes of one ingredient, "
+                "those nearest by id when there are more"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of recipes whose neighbours are saved at once",
+        )
+
+    def load(self):
+        """Ingredient ids of every recipe and recipe ids of every ingredient."""
+        recipes = defaultdict(list)
+        postings = defaultdict(lambda: array(ID_TYPECODE))
+        rows = (
+            RecipeIngredient.objects.order_by("recipe_id", "ingredient_id")
+            .values_list("recipe_id", "ingredient_id")
+            .iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id].append(ingredient_id)
+            # Rows come by recipe id, so every posting stays sorted.
+            postings[ingredient_id].append(recipe_id)
+        return recipes, postings
+
+    @staticmethod
+    def nearest(posting, recipe_id, limit):
+        """Up to ``limit`` ids of ``posting`` around ``recipe_id``."""
+        if len(posting) <= limit:
+            return posting
+        end = max(bisect_left(posting, recipe_id) + limit // 2, limit)
+        end = min(end, len(posting))
+        start = end - limit
+        return posting[start:end]
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes, postings = self.load()
+        total = len(recipes)
+        if options["no_idf"]:
+            weights = dict.fromkeys(postings, 1.0)
+        else:
+            # Smoothed inverse document frequency.
+            weights = {
+                ingredient_id: math.log((1 + total) / (1 + len(posting))) + 1
+                for ingredient_id, posting in postings.items()
+            }
+        cosine = options["metric"] == "cosine"
+        # Per ingredient contribution to the intersection of two recipes,
+        # and the norm of every recipe it is divided by.
+        contributions = {
+            ingredient_id: weight**2 if cosine else weight
+            for ingredient_id, weight in weights.items()
+        }
+        norms = {}
+        for recipe_id, ingredient_ids in recipes.items():
+            norm = sum(contributions[pk] for pk in ingredient_ids)
+            norms[recipe_id] = math.sqrt(norm) if cosine else norm
+        max_df = options["max_df"] * total
+        max_candidates = options["max_candidates"]
+
+        saved = 0
+        batch = {}
+        for recipe_id, ingredient_ids in recipes.items():
+            rare = [pk for pk in ingredient_ids if len(postings[pk]) <= max_df]
+            common = set(ingredient_ids).difference(rare)
+            # Candidates come from the rare ingredients, all of them when
+            # the recipe has only common ones, so no posting is walked
+            # past max_candidates recipes.
+            intersections = defaultdict(float)
+            for ingredient_id in rare or ingredient_ids:
+                contribution = contributions[ingredient_id]
+                for other_id in self.nearest(
+                    postings[ingredient_id], recipe_id, max_candidates
+                ):
+                    intersections[other_id] += contribution
+            if rare:
+                for ingredient_id in common:
+                    posting = postings[ingredient_id]
+                    for other_id in intersections:
+                        if contains(posting, other_id):
+                            intersections[other_id] += contributions[
+                                ingredient_id
+                            ]
+            intersections.pop(recipe_id, None)
+
+            norm = norms[recipe_id]
+            if cosine:
+                scores = (
+                    (intersection / (norm * norms[other_id]), other_id)
+                    for other_id, intersection in intersections.items()
+                )
+            else:
+                scores = (
+                    (
+                        intersection / (norm + norms[other_id] - intersection),
+                        other_id,
+                    )
+                    for other_id, intersection in intersections.items()
+                )
+            batch[recipe_id] = heapq.nlargest(options["top_k"], scores)
+            if len(batch) == options["batch_size"]:
+                saved += self.save_batch(batch)
+                batch = {}
+        saved += self.save_batch(batch)
+
+        # Recipes whose ingredients are all gone.
+        removed, _ = SimilarRecipe.objects.exclude(
+            recipe_id__in=RecipeIngredient.objects.values("recipe_id")
+        ).delete()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved {saved} neighbours of {total} recipes "
+                f"({options['metric']}"
+                f"{'' if options['no_idf'] else ', IDF weighted'}), "
+                f"removed {removed} stale in {elapsed:.1f}s"
+            )
+        )
+
+    @transaction.atomic
+    def save_batch(self, batch):
+        # Recipes may have been deleted since they were loaded.
+        existing = set(
+            Recipe.objects.filter(
+                pk__in={
+                    pk
+                    for recipe_id, neighbours in batch.items()
+                    for pk in (recipe_id, *(pk for _, pk in neighbours))
+                }
+            ).values_list("pk", flat=True)
+        )
+        SimilarRecipe.objects.filter(recipe_id__in=batch).delete()
+        return len(
+            SimilarRecipe.objects.bulk_create(
+                [
+                    SimilarRecipe(
+                        recipe_id=recipe_id,
+                        similar_id=similar_id,
+                        score=round(score, 6),
+                    )
+                    for recipe_id, neighbours in batch.items()
+                    if recipe_id in existing
+                    for score, similar_id in neighbours
+                    if similar_id in existing
+                ]
+            )
+        )
@@ -0,0 +1,79 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = "Export recipes as JSON Lines, one recipe per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file_path",
+            nargs="?",
+            default="-",
+            help="Path to the output file, standard output by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of recipes fetched from the database at once",
+        )
+
+    def get_lines(self, chunk_size):
+        recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related(
+                Prefetch(
+                    "recipe_ingredients",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                )
+            )
+            .order_by("id")
+        )
+        for recipe in recipes.iterator(chunk_size=chunk_size):
+            yield json.dumps(
+                {
+                    "author": recipe.author.username,
+                    "name": recipe.name,
+                    "text": recipe.text,
+                    "cooking_time": recipe.cooking_time,
+                    "image": recipe.image.name,
+                    "ingredients": [
+                        {
+                            "name": recipe_ingredient.ingredient.name,
+                            "measurement_unit": (
+                                recipe_ingredient.ingredient.measurement_unit
+                            ),
+                            "amount": recipe_ingredient.amount,
+                        }
+                        for recipe_ingredient in (
+                            recipe.recipe_ingredients.all()
+                        )
+                    ],
+                },
+                ensure_ascii=False,
+            )
+
+    def handle(self, *args, **options):
+        if options["file_path"] == "-":
+            file = sys.stdout
+        else:
+            file = open(options["file_path"], "w", encoding="utf-8")
+
+        exported = 0
+        try:
+            for line in self.get_lines(options["chunk_size"]):
+                file.write(line + "\n")
+                exported += 1
+        finally:
+            if file is not sys.stdout:
+                file.close()
+
+        self.stderr.write(self.style.SUCCESS(f"Exported {exported} recipes"))
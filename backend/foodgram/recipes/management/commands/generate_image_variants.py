@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import IMAGE_VARIANTS, generate_variants, needs_variants
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = "Render missing or outdated image variants"
+
+    def handle(self, *args, **options):
+        for model in (Recipe, User):
+            for field_name in IMAGE_VARIANTS[model._meta.label_lower]:
+                rendered = failed = 0
+                for instance in model.objects.exclude(
+                    **{field_name: ""}
+                ).iterator():
+                    if not needs_variants(instance, field_name):
+                        continue
+                    # A missing or corrupt file must not stop the others.
+                    try:
+                        generate_variants(
+                            model._meta.label_lower, instance.pk, field_name
+                        )
+                    except Exception as error:
+                        self.stderr.write(
+                            f"Failed to render {field_name} variants of "
+                            f"{model._meta.model_name} {instance.pk}: "
+                            f"{error!r}"
+                        )
+                        failed += 1
+                    else:
+                        rendered += 1
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Rendered {field_name} variants "
+                        f"of {rendered} {model._meta.model_name} objects, "
+                        f"failed {failed}"
+                    )
+                )
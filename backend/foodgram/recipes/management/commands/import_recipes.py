@@ -0,0 +1,182 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import invalidate_model_count, invalidate_recipes
+from recipes.counters import recount
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIndexChange,
+    RecipeIngredient,
+    User,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import recipes from JSON Lines written by export_recipes. "
+        "Authors and ingredients must exist, image files are referenced "
+        "by name and not copied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_path", help="Path to JSON Lines file")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of recipes saved in one transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help=(
+                "File storing the number of processed lines. The import "
+                "continues after it and updates it after every batch"
+            ),
+        )
+
+    def read_checkpoint(self, path):
+        if path is None or not os.path.exists(path):
+            return 0
+        with open(path, encoding="utf-8") as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, path, line_number):
+        if path is None:
+            return
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(str(line_number))
+        os.replace(temporary_path, path)
+
+    def parse(self, line, authors, ingredients):
+        """Build unsaved Recipe and RecipeIngredient objects of a line."""
+        try:
+            data = json.loads(line)
+            recipe = Recipe(
+                author_id=authors[data["author"]],
+                name=data["name"],
+                text=data["text"],
+                cooking_time=data["cooking_time"],
+                image=data["image"],
+                # Not copied to timelines, feeds read it from Recipe.
+                fanned_out=False,
+            )
+            recipe_ingredients = [
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredients[
+                        item["name"], item["measurement_unit"]
+                    ],
+                    amount=item["amount"],
+                )
+                for item in data["ingredients"]
+            ]
+        except json.JSONDecodeError as error:
+            raise ValueError(f"invalid JSON: {error}")
+        except KeyError as error:
+            raise ValueError(f"unknown or missing {error}")
+        except TypeError:
+            raise ValueError("invalid recipe")
+        if not recipe_ingredients:
+            raise ValueError("no ingredients")
+        self.clean(recipe, ("name", "text", "cooking_time"))
+        for recipe_ingredient in recipe_ingredients:
+            self.clean(recipe_ingredient, ("amount",))
+        return recipe, recipe_ingredients
+
+    def clean(self, instance, field_names):
+        """Check fields with the model validators, bulk_create doesn't.
+
+        Values out of their bounds would fail the whole batch on insert.
+        """
+        for field_name in field_names:
+            field = instance._meta.get_field(field_name)
+            try:
+                setattr(
+                    instance,
+                    field.attname,
+                    field.clean(getattr(instance, field.attname), instance),
+                )
+            except ValidationError as error:
+                raise ValueError(
+                    f"invalid {field_name}: {' '.join(error.messages)}"
+                )
+
+    @transaction.atomic
+    def save_batch(self, batch):
+        recipes = Recipe.objects.bulk_create([recipe for recipe, _ in batch])
+        RecipeIngredient.objects.bulk_create(
+            [
+                recipe_ingredient
+                for _, recipe_ingredients in batch
+                for recipe_ingredient in recipe_ingredients
+            ]
+        )
+        # bulk_create sends no signals to update authors' recipe counts.
+        recount(User, {recipe.author_id for recipe in recipes})
+        return len(recipes)
+
+    def handle(self, *args, **options):
+        checkpoint = options["checkpoint"]
+        start = self.read_checkpoint(checkpoint)
+        authors = dict(User.objects.values_list("username", "id"))
+        ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit"
+                )
+            )
+        }
+
+        imported = skipped = 0
+        line_number = start
+        batch = []
+        started = time.monotonic()
+        try:
+            with open(options["file_path"], encoding="utf-8") as file:
+                for line_number, line in enumerate(
+                    islice(file, start, None), start + 1
+                ):
+                    if line.strip():
+                        try:
+                            batch.append(
+                                self.parse(line, authors, ingredients)
+                            )
+                        except ValueError as error:
+                            skipped += 1
+                            self.stderr.write(
+                                f"Line {line_number} skipped: {error}"
+                            )
+                    if len(batch) == options["batch_size"]:
+                        imported += self.save_batch(batch)
+                        batch = []
+                        self.write_checkpoint(checkpoint, line_number)
+            if batch:
+                imported += self.save_batch(batch)
+            self.write_checkpoint(checkpoint, line_number)
+        except FileNotFoundError:
+            raise CommandError(f"File {options['file_path']} not found")
+        finally:
+            if imported:
+                # bulk_create sends no signals.
+                invalidate_model_count(Recipe)
+                invalidate_recipes([])
+                RecipeIndexChange.objects.log()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} recipes, skipped {skipped} lines "
+                f"in {elapsed:.1f}s "
+                f"({imported / max(elapsed, 0.001):.0f} recipes/s), "
+                f"processed {line_number} lines"
+            )
+        )
@@ -1,53 +1,166 @@
+import csv
 import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
+from recipes.cache import invalidate_ingredient_index
 from recipes.models import Ingredient
+from recipes.units import normalize_unit
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Yield the items of a top-level JSON array without loading it all."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators before the next value.
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer) and not eof:
+            chunk = file.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if position == len(buffer):
+            raise ValueError("Unexpected end of file")
+        if not started:
+            if not buffer.startswith("[", position):
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer.startswith("]", position):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if eof:
+                raise ValueError(f"Invalid JSON value: {error.msg}")
+            # The value is cut at the end of the buffer, read more.
+            chunk = file.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = end
+        yield item
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield {
+                "name": row[0],
+                "measurement_unit": row[1] if len(row) > 1 else "",
+            }
 
 
 class Command(BaseCommand):
-    help = "Load ingredients from JSON file"
+    help = (
+        "Load ingredients from a JSON array or a CSV file of "
+        "name,measurement_unit rows. Units are normalized, e.g. "
+        '"гр" to "г". Existing ingredients are kept.'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("file_path", type=str, help="Path to JSON file")
+        parser.add_argument(
+            "file_path", type=str, help="Path to JSON or CSV file"
+        )
+        parser.add_argument(
+            "--format",
+            choices=("json", "csv"),
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of ingredients inserted in one statement",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be inserted",
+        )
+
+    def get_items(self, file, file_format):
+        if file_format == "csv":
+            return iter_csv(file)
+        return iter_json_array(file)
 
     def handle(self, *args, **options):
         file_path = options["file_path"]
+        file_format = options["format"] or (
+            "csv"
+            if os.path.splitext(file_path)[1].lower() == ".csv"
+            else "json"
+        )
+        existing = set(
+            Ingredient.objects.values_list("name", "measurement_unit")
+        )
+        inserted = skipped = invalid = read = 0
+        started = time.monotonic()
 
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-
-            with transaction.atomic():
-                ingredients_to_create = [
-                    Ingredient(
-                        name=item["name"].lower(),
-                        measurement_unit=item["measurement_unit"].lower(),
-                    )
-                    for item in data
-                ]
-
-                # Используем bulk_create для эффективной вставки
-                Ingredient.objects.bulk_create(
-                    ingredients_to_create,
-                    ignore_conflicts=True,
-                )
-
-            total_ingredients = len(ingredients_to_create)
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Successfully loaded {total_ingredients} ingredients"
-                )
-            )
-
+            with open(file_path, "r", encoding="utf-8", newline="") as file:
+                items = self.get_items(file, file_format)
+                while batch := list(islice(items, options["batch_size"])):
+                    read += len(batch)
+                    new = []
+                    for item in batch:
+                        try:
+                            key = (
+                                item["name"].strip().lower(),
+                                normalize_unit(item["measurement_unit"]),
+                            )
+                        except (KeyError, TypeError, AttributeError):
+                            invalid += 1
+                            continue
+                        if not all(key) or key in existing:
+                            skipped += 1
+                            continue
+                        existing.add(key)
+                        new.append(
+                            Ingredient(name=key[0], measurement_unit=key[1])
+                        )
+                    added = self.insert(new, options["dry_run"])
+                    inserted += added
+                    skipped += len(new) - added
         except FileNotFoundError:
-            self.stdout.write(self.style.ERROR(f"File {file_path} not found"))
-        except json.JSONDecodeError:
-            self.stdout.write(
-                self.style.ERROR(f"File {file_path} is not valid JSON")
-            )
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f"Error loading ingredients: {str(e)}")
+            raise CommandError(f"File {file_path} not found")
+        except (ValueError, csv.Error) as error:
+            raise CommandError(f"File {file_path} is not valid: {error}")
+
+        if inserted and not options["dry_run"]:
+            invalidate_ingredient_index()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Would insert' if options['dry_run'] else 'Inserted'} "
+                f"{inserted} ingredients, skipped {skipped} existing or "
+                f"duplicate and {invalid} invalid of {read} read "
+                f"in {elapsed:.2f}s ({read / max(elapsed, 0.001):.0f}/s)"
             )
+        )
+
+    def insert(self, ingredients, dry_run):
+        """Insert ingredients, return the number of rows really added."""
+        if dry_run or not ingredients:
+            return len(ingredients)
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            # Rows added concurrently since the existing names were read
+            # are skipped by the database.
+            Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
+            return Ingredient.objects.count() - before
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Rebuild aggregated shopping lists from shopping carts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare stored lists with carts, don't rebuild",
+        )
+
+    def handle(self, *args, **options):
+        live_totals = ShoppingListItem.objects.live_totals()
+        stored_totals = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in (
+                ShoppingListItem.objects.values_list(
+                    "user_id", "ingredient_id", "total_amount"
+                )
+            )
+        }
+        drifted = {
+            key
+            for key in live_totals.keys() | stored_totals.keys()
+            if live_totals.get(key) != stored_totals.get(key)
+        }
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(
+                    f"{len(drifted)} shopping list rows differ from carts"
+                )
+            self.stdout.write(
+                self.style.SUCCESS("Shopping lists match shopping carts")
+            )
+            return
+
+        ShoppingListItem.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(live_totals)} shopping list rows, "
+                f"{len(drifted)} of them were out of date"
+            )
+        )
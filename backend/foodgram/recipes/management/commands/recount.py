@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = "Recalculate favorites, recipes and subscription counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report counters that are out of date",
+        )
+
+    def handle(self, *args, **options):
+        drifted = {
+            model._meta.model_name: recount(model, check=options["check"])
+            for model in COUNTERS
+        }
+        summary = ", ".join(
+            f"{count} {name} rows" for name, count in drifted.items()
+        )
+        if options["check"]:
+            if any(drifted.values()):
+                raise CommandError(f"Counters out of date: {summary}")
+            self.stdout.write(self.style.SUCCESS("Counters are up to date"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Fixed counters of {summary}"))
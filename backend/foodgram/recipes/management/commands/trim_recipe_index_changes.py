@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.models import RecipeIndexChange
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete recipe index changes older than "
+        "RECIPE_INDEX_CHANGE_RETENTION seconds. Meant to be run "
+        "periodically, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=settings.RECIPE_INDEX_CHANGE_RETENTION,
+            help=(
+                "Keep changes logged less than this many seconds ago, "
+                "processes whose index is older rebuild it"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["max_age"] < 0:
+            raise CommandError("--max-age must not be negative")
+        deleted = RecipeIndexChange.objects.trim(
+            timezone.now() - timedelta(seconds=options["max_age"])
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} recipe index changes")
+        )
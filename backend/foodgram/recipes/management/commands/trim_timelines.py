@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the oldest entries of following feed timelines beyond "
+        "FEED_TIMELINE_SIZE. Meant to be run periodically, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=settings.FEED_TIMELINE_SIZE,
+            help="Number of newest entries kept per timeline",
+        )
+
+    def handle(self, *args, **options):
+        if options["size"] < 1:
+            raise CommandError("--size must be at least 1")
+        deleted = TimelineEntry.objects.trim(options["size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} timeline entries")
+        )
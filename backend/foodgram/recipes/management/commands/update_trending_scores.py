@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from recipes.cache import invalidate_recipes
+from recipes.models import FavoriteRecipe, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate Recipe.trending_score from recent favorites. "
+        "Meant to be run periodically, e.g. every 15 minutes."
+    )
+
+    def get_scores(self, now):
+        """Decayed number of favorites per recipe, by hourly buckets."""
+        scores = {}
+        half_life = settings.TRENDING_HALF_LIFE.total_seconds()
+        buckets = (
+            FavoriteRecipe.objects.filter(
+                created__gte=now - settings.TRENDING_WINDOW
+            )
+            .annotate(hour=TruncHour("created"))
+            .values_list("recipe_id", "hour")
+            .annotate(count=Count("*"))
+            .order_by()
+        )
+        for recipe_id, hour, count in buckets:
+            age = max((now - hour).total_seconds(), 0)
+            scores[recipe_id] = scores.get(recipe_id, 0) + count * 0.5 ** (
+                age / half_life
+            )
+        return scores
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        scores = self.get_scores(now)
+        changed = [
+            Recipe(pk=recipe_id, trending_score=round(score, 6))
+            for recipe_id, score in scores.items()
+        ]
+        with transaction.atomic():
+            # Recipes that fell out of the window.
+            reset = (
+                Recipe.objects.filter(trending_score__gt=0)
+                .exclude(pk__in=scores)
+                .update(trending_score=0)
+            )
+            Recipe.objects.bulk_update(
+                changed, ["trending_score"], batch_size=1000
+            )
+        transaction.on_commit(lambda: invalidate_recipes([]))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated trending scores of {len(changed)} recipes, "
+                f"reset {reset}"
+            )
+        )
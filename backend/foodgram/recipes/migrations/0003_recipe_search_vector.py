@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:49
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce({table}.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({table}.text, '')), 'B')"
+)
+
+
+def create_search_vector(apps, schema_editor):
+    """Maintain Recipe.search_vector with a trigger and index it with GIN.
+
+    Full-text search is PostgreSQL-only, other databases keep the column
+    empty and Recipe.objects.search() falls back to icontains.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE FUNCTION recipes_recipe_search_vector_update() "
+        "RETURNS trigger AS $$ BEGIN "
+        f"NEW.search_vector := {SEARCH_VECTOR_SQL.format(table='NEW')}; "
+        "RETURN NEW; END $$ LANGUAGE plpgsql"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER recipes_recipe_search_vector_trigger "
+        "BEFORE INSERT OR UPDATE ON recipes_recipe FOR EACH ROW "
+        "EXECUTE FUNCTION recipes_recipe_search_vector_update()"
+    )
+    schema_editor.execute(
+        "UPDATE recipes_recipe SET search_vector = "
+        f"{SEARCH_VECTOR_SQL.format(table='recipes_recipe')}"
+    )
+    schema_editor.execute(
+        "CREATE INDEX recipes_recipe_search_vector_gin "
+        "ON recipes_recipe USING gin (search_vector)"
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP INDEX IF EXISTS recipes_recipe_search_vector_gin"
+    )
+    schema_editor.execute(
+        "DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger "
+        "ON recipes_recipe"
+    )
+    schema_editor.execute(
+        "DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0002_shoppinglistitem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
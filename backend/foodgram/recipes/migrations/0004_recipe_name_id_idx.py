@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0003_recipe_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["name", "id"], name="recipe_name_id_idx"
+            ),
+        ),
+    ]
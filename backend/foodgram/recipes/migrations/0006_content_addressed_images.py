@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:01
+
+import recipes.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0005_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(
+                storage=recipes.storage.ContentAddressedStorage(),
+                upload_to="recipes/",
+                verbose_name="изображение",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=recipes.storage.ContentAddressedStorage(),
+                upload_to="avatars/",
+                verbose_name="Аватар",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# model: {counter: (counted model, field pointing to the object)}
+COUNTERS = {
+    "Recipe": {"favorites_count": ("FavoriteRecipe", "recipe")},
+    "User": {
+        "recipes_count": ("Recipe", "author"),
+        "followers_count": ("Subscription", "author"),
+        "following_count": ("Subscription", "user"),
+    },
+}
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, counters in COUNTERS.items():
+        apps.get_model("recipes", model_name).objects.update(
+            **{
+                counter: Coalesce(
+                    Subquery(
+                        apps.get_model("recipes", counted_model)
+                        .objects.filter(**{field: OuterRef("pk")})
+                        .order_by()
+                        .values(field)
+                        .annotate(count=Count("*"))
+                        .values("count")
+                    ),
+                    Value(0),
+                )
+                for counter, (counted_model, field) in counters.items()
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="в избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="подписчики"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="подписки"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="recipes_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="рецепты"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["favorites_count", "id"],
+                name="recipe_favorites_count_id_idx",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    """Backfill timelines of existing subscriptions, see TimelineManager."""
+    Recipe = apps.get_model("recipes", "Recipe")
+    Subscription = apps.get_model("recipes", "Subscription")
+    TimelineEntry = apps.get_model("recipes", "TimelineEntry")
+    subscriptions = Subscription.objects.filter(
+        author__followers_count__lt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list("user_id", "author_id")
+    recent_recipes = {}
+    for user_id, author_id in subscriptions.iterator():
+        if author_id not in recent_recipes:
+            recent_recipes[author_id] = list(
+                Recipe.objects.filter(author_id=author_id)
+                .order_by("-id")
+                .values_list("id", flat=True)[: settings.FEED_BACKFILL_SIZE]
+            )
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in recent_recipes[author_id]
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0009_trending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="recipes.recipe",
+                        verbose_name="рецепт",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "запись ленты",
+                "verbose_name_plural": "записи ленты",
+                "ordering": ("user", "-recipe_id"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "recipe"), name="unique_timeline_entry"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
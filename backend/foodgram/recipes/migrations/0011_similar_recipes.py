@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0010_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarRecipe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="сходство")),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_recipes",
+                        to="recipes.recipe",
+                        verbose_name="рецепт",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="recipes.recipe",
+                        verbose_name="похожий рецепт",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "похожий рецепт",
+                "verbose_name_plural": "похожие рецепты",
+                "ordering": ("recipe", "-score"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("recipe", "similar"),
+                        name="unique_similar_recipe",
+                    )
+                ],
+            },
+        ),
+    ]
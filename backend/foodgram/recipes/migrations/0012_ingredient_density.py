@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:19
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0011_similar_recipes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="density",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                validators=[django.core.validators.MinValueValidator(0.01)],
+                verbose_name="плотность, г/мл",
+            ),
+        ),
+    ]
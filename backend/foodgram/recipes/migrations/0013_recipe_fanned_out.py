@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_read_recipes(apps, schema_editor):
+    """Recipes of authors that were not fanned out, see TimelineManager."""
+    Recipe = apps.get_model("recipes", "Recipe")
+    Recipe.objects.filter(
+        author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0012_ingredient_density"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="fanned_out",
+            field=models.BooleanField(
+                default=True,
+                editable=False,
+                verbose_name="в лентах подписчиков",
+            ),
+        ),
+        migrations.RunPython(mark_read_recipes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                condition=models.Q(("fanned_out", False)),
+                fields=["-id"],
+                name="recipe_read_feed_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:05
+
+from django.db import migrations
+
+
+def create_trigger(schema_editor, columns):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger "
+        "ON recipes_recipe"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER recipes_recipe_search_vector_trigger "
+        f"BEFORE INSERT OR UPDATE{columns} ON recipes_recipe FOR EACH ROW "
+        "EXECUTE FUNCTION recipes_recipe_search_vector_update()"
+    )
+
+
+def limit_trigger_columns(apps, schema_editor):
+    """Recompute search_vector only when name or text is updated.
+
+    Counter updates of favorites_count or trending_score don't rebuild
+    the vector any more.
+    """
+    create_trigger(schema_editor, " OF name, text")
+
+
+def restore_trigger_columns(apps, schema_editor):
+    create_trigger(schema_editor, "")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0013_recipe_fanned_out"),
+    ]
+
+    operations = [
+        migrations.RunPython(limit_trigger_columns, restore_trigger_columns),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0014_search_vector_trigger_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeIndexChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "recipe_id",
+                    models.BigIntegerField(
+                        null=True, verbose_name="id рецепта"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="создано"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение индекса рецептов",
+                "verbose_name_plural": "изменения индекса рецептов",
+                "ordering": ("id",),
+            },
+        ),
+    ]
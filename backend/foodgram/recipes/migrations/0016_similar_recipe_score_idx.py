@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0015_recipe_index_change"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="similarrecipe",
+            options={
+                "ordering": ("recipe_id", "-score"),
+                "verbose_name": "похожий рецепт",
+                "verbose_name_plural": "похожие рецепты",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="similarrecipe",
+            index=models.Index(
+                fields=["recipe", "-score"],
+                name="similarrecipe_recipe_score_idx",
+            ),
+        ),
+    ]
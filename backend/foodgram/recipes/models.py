@@ -1,17 +1,74 @@
-from django.db import models
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+)
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Cast
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 
+from .storage import content_addressed_storage
+from .units import canonical_amount, canonical_unit
 
-class User(AbstractUser):
+
+class CounterFieldsMixin:
+    """Leave ``counter_fields`` out of the UPDATE of a plain save().
+
+    Counters are changed by UPDATE queries with F() expressions, writing
+    back the values an instance was loaded with would undo concurrent
+    changes. They are saved only when listed in ``update_fields``.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not (
+            self._state.adding
+            or kwargs.get("force_insert")
+            or kwargs.get("update_fields") is not None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Foodgram user model"""
 
     email = models.EmailField("Электронная почта", unique=True, max_length=254)
     first_name = models.CharField("Имя", max_length=150)
     last_name = models.CharField("Фамилия", max_length=150)
     avatar = models.ImageField(
-        "Аватар", upload_to="avatars/", blank=True, null=True
+        "Аватар",
+        upload_to="avatars/",
+        storage=content_addressed_storage,
+        blank=True,
+        null=True,
+    )
+    avatar_variants = models.JSONField(
+        "варианты аватара", default=dict, blank=True, editable=False
+    )
+    # Counters are maintained by recipes.signals, see recipes.counters.
+    recipes_count = models.PositiveIntegerField(
+        "рецепты", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "подписчики", default=0, editable=False
+    )
+    following_count = models.PositiveIntegerField(
+        "подписки", default=0, editable=False
     )
     username = models.CharField(
         "Никнейм",
@@ -31,6 +88,7 @@ class User(AbstractUser):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
+    counter_fields = ("recipes_count", "followers_count", "following_count")
 
     class Meta:
         ordering = ("username",)
@@ -50,11 +108,13 @@ class Subscription(models.Model):
         related_name="authors",
         verbose_name="Автор",
     )
+    # Indexed by unique_subscription.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="followers",
         verbose_name="Подписчик",
+        db_index=False,
     )
 
     class Meta:
@@ -71,14 +131,54 @@ class Subscription(models.Model):
         return f"{self.user} подписан на {self.author}"
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def search(self, value):
+        """Full-text search over name and text, annotated with search_rank.
+
+        PostgreSQL uses the trigger-maintained ``search_vector`` column
+        (see migration 0003); other databases fall back to matching every
+        word with ``icontains``, ranking name matches higher.
+        """
+        if connections[self.db].vendor == "postgresql":
+            query = SearchQuery(
+                value, config="russian", search_type="websearch"
+            )
+            # ts_rank() returns a real, a double precision rank compares
+            # exactly with the one stored in a page cursor.
+            return self.filter(search_vector=query).annotate(
+                search_rank=Cast(
+                    SearchRank(F("search_vector"), query), models.FloatField()
+                )
+            )
+
+        condition = Q()
+        search_rank = Value(0)
+        for word in value.split():
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+            search_rank += Case(
+                When(name__icontains=word, then=Value(2)), default=Value(0)
+            ) + Case(
+                When(text__icontains=word, then=Value(1)), default=Value(0)
+            )
+        return self.filter(condition).annotate(search_rank=search_rank)
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    def get_queryset(self):
+        # The tsvector is only filtered on, never worth loading.
+        return super().get_queryset().defer("search_vector")
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Recipe model"""
 
+    # Indexed by recipe_author_name_id_idx.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="recipes",
         verbose_name="автор",
+        db_index=False,
     )
     name = models.CharField("название", max_length=256)
     text = models.TextField(verbose_name="описание")
@@ -92,10 +192,59 @@ class Recipe(models.Model):
         "время приготовления (в минутах)",
         validators=[MinValueValidator(1)],
     )
-    image = models.ImageField("изображение", upload_to="recipes/")
+    image = models.ImageField(
+        "изображение",
+        upload_to="recipes/",
+        storage=content_addressed_storage,
+    )
+    image_variants = models.JSONField(
+        "варианты изображения", default=dict, blank=True, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        "в избранном", default=0, editable=False
+    )
+    # Recent favorites with time decay, see update_trending_scores.
+    trending_score = models.FloatField(
+        "популярность за период", default=0, editable=False
+    )
+    created = models.DateTimeField("дата публикации", auto_now_add=True)
+    # False when followers read the recipe from here instead of their
+    # timelines, see TimelineManager.
+    fanned_out = models.BooleanField(
+        "в лентах подписчиков", default=True, editable=False
+    )
+
+    objects = RecipeManager()
+    counter_fields = ("favorites_count", "trending_score")
 
     class Meta:
         ordering = ("name",)
+        indexes = [
+            models.Index(fields=["name", "id"], name="recipe_name_id_idx"),
+            models.Index(
+                fields=["favorites_count", "id"],
+                name="recipe_favorites_count_id_idx",
+            ),
+            models.Index(
+                fields=["trending_score", "id"],
+                name="recipe_trending_score_id_idx",
+            ),
+            models.Index(
+                fields=["created", "id"], name="recipe_created_id_idx"
+            ),
+            # Recipes of an author in list order, recipe previews.
+            models.Index(
+                fields=["author", "name", "id"],
+                name="recipe_author_name_id_idx",
+            ),
+            # Recipes merged into feeds at read time.
+            models.Index(
+                fields=["-id"],
+                condition=Q(fanned_out=False),
+                name="recipe_read_feed_id_idx",
+            ),
+        ]
         verbose_name = "рецепт"
         verbose_name_plural = "рецепты"
 
@@ -114,6 +263,12 @@ class Ingredient(models.Model):
         "единица измерения",
         max_length=256,
     )
+    density = models.FloatField(
+        "плотность, г/мл",
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.01)],
+    )
 
     class Meta:
         ordering = ("name",)
@@ -133,11 +288,13 @@ class Ingredient(models.Model):
 class RecipeIngredient(models.Model):
     """Many to many relationship between Recipe and Ingredient"""
 
+    # Indexed by recipeingredient_recipe_idx.
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name="recipe_ingredients",
         verbose_name="рецепт",
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -151,7 +308,14 @@ class RecipeIngredient(models.Model):
     )
 
     class Meta:
-        ordering = ("recipe", "ingredient")
+        # "recipe" would order by Recipe.Meta.ordering and join recipes.
+        ordering = ("recipe_id", "ingredient__name")
+        indexes = [
+            models.Index(
+                fields=["recipe", "ingredient"],
+                name="recipeingredient_recipe_idx",
+            ),
+        ]
         verbose_name = "ингредиент в рецепте"
         verbose_name_plural = "ингредиенты в рецепте"
 
@@ -165,11 +329,13 @@ class RecipeIngredient(models.Model):
 class UserRecipeRelation(models.Model):
     """Model for user recipe relations"""
 
+    # Indexed by the unique constraint.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name="пользователь",
         related_name="%(class)ss",
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -194,6 +360,10 @@ class UserRecipeRelation(models.Model):
 class FavoriteRecipe(UserRecipeRelation):
     """Model for favorite recipes"""
 
+    created = models.DateTimeField(
+        "дата добавления", auto_now_add=True, db_index=True
+    )
+
     class Meta(UserRecipeRelation.Meta):
         verbose_name = "избранный рецепт"
         verbose_name_plural = "избранные рецепты"
@@ -205,3 +375,476 @@ class ShoppingCart(UserRecipeRelation):
     class Meta(UserRecipeRelation.Meta):
         verbose_name = "рецепт в списке покупок"
         verbose_name_plural = "рецепты в списке покупок"
+
+
+class ShoppingListManager(models.Manager):
+    """Incremental maintenance of the aggregated shopping lists."""
+
+    def live_totals(self, **cart_filters):
+        """Aggregate ShoppingCart contents straight from recipes.
+
+        Returns a ``{(user_id, ingredient_id): total_amount}`` mapping.
+        """
+        rows = (
+            ShoppingCart.objects.filter(**cart_filters)
+            .values("user", "recipe__recipe_ingredients__ingredient")
+            .annotate(total_amount=Sum("recipe__recipe_ingredients__amount"))
+            .order_by()
+        )
+        return {
+            (row["user"], row["recipe__recipe_ingredients__ingredient"]): (
+                row["total_amount"]
+            )
+            for row in rows
+            if row["recipe__recipe_ingredients__ingredient"] is not None
+        }
+
+    def canonical_totals(self, user):
+        """Shopping list of ``user`` in canonical units, by name.
+
+        Ingredients of the same name are summed per canonical unit in one
+        query, see recipes.units. Yields dicts with ``name``,
+        ``measurement_unit`` and float ``amount``.
+        """
+        return (
+            self.filter(user=user)
+            .values(
+                name=F("ingredient__name"),
+                measurement_unit=canonical_unit(
+                    "ingredient__measurement_unit", "ingredient__density"
+                ),
+            )
+            .annotate(
+                amount=Sum(
+                    canonical_amount(
+                        "total_amount",
+                        "ingredient__measurement_unit",
+                        "ingredient__density",
+                    )
+                )
+            )
+            .order_by("name", "measurement_unit")
+        )
+
+    @transaction.atomic
+    def apply_deltas(self, deltas):
+        """Add ``{(user_id, ingredient_id): delta}`` to the stored totals.
+
+        Rows whose total drops to zero are removed.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in deltas},
+                ingredient_id__in={
+                    ingredient_id for _, ingredient_id in deltas
+                },
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(
+                        self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=delta,
+                        )
+                    )
+                continue
+            item.total_amount += delta
+            if item.total_amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+        if to_create:
+            try:
+                with transaction.atomic():
+                    self.bulk_create(to_create)
+            except IntegrityError:
+                # select_for_update() doesn't lock missing rows, so a
+                # concurrent transaction has inserted some of them since.
+                # Now they exist and are locked and updated on the retry.
+                self.apply_deltas(
+                    {
+                        (item.user_id, item.ingredient_id): item.total_amount
+                        for item in to_create
+                    }
+                )
+        if to_update:
+            self.bulk_update(to_update, ["total_amount"])
+        if to_delete:
+            self.filter(pk__in=to_delete).delete()
+
+    def _recipe_amounts(self, recipe):
+        return dict(
+            RecipeIngredient.objects.filter(recipe=recipe).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+    def add_recipe(self, user, recipe, sign=1):
+        """Account for ``recipe`` being added to ``user``'s cart."""
+        self.apply_deltas(
+            {
+                (user.pk, ingredient_id): sign * amount
+                for ingredient_id, amount in self._recipe_amounts(
+                    recipe
+                ).items()
+            }
+        )
+
+    def remove_recipe(self, user, recipe):
+        """Account for ``recipe`` being removed from ``user``'s cart."""
+        self.add_recipe(user, recipe, sign=-1)
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Propagate a change of recipe ingredients to every cart with it.
+
+        ``old_amounts`` and ``new_amounts`` map ingredient ids to amounts.
+        """
+        ingredient_deltas = defaultdict(int)
+        for ingredient_id, amount in new_amounts.items():
+            ingredient_deltas[ingredient_id] += amount
+        for ingredient_id, amount in old_amounts.items():
+            ingredient_deltas[ingredient_id] -= amount
+        ingredient_deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in ingredient_deltas.items()
+            if delta
+        }
+        if not ingredient_deltas:
+            return
+        self.apply_deltas(
+            {
+                (user_id, ingredient_id): delta
+                for user_id in ShoppingCart.objects.filter(
+                    recipe=recipe
+                ).values_list("user_id", flat=True)
+                for ingredient_id, delta in ingredient_deltas.items()
+            }
+        )
+
+    @transaction.atomic
+    def rebuild(self):
+        """Recreate every shopping list from the live aggregate."""
+        self.all().delete()
+        self.bulk_create(
+            [
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount,
+                )
+                for (user_id, ingredient_id), total_amount in (
+                    self.live_totals().items()
+                )
+            ],
+            batch_size=1000,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Ingredient totals of a user's shopping cart, kept up to date"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="ингредиент",
+    )
+    total_amount = models.PositiveIntegerField("общее количество")
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        ordering = ("user", "ingredient")
+        verbose_name = "позиция списка покупок"
+        verbose_name_plural = "позиции списка покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_item",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.user} - {self.ingredient.name} "
+            f"{self.total_amount} {self.ingredient.measurement_unit}"
+        )
+
+
+class TimelineManager(models.Manager):
+    """Fan-out-on-write timelines of the authors a user follows.
+
+    Recipes posted while their author had FEED_FANOUT_MAX_FOLLOWERS
+    followers or more are not copied to timelines (``Recipe.fanned_out``
+    is False), the feed reads them from Recipe instead. Timelines are
+    trimmed to FEED_TIMELINE_SIZE entries by the trim_timelines command.
+    """
+
+    def is_fanned_out(self, author):
+        return author.followers_count < settings.FEED_FANOUT_MAX_FOLLOWERS
+
+    def fan_out(self, recipe):
+        """Add a new recipe to the timelines of its author's followers."""
+        if not recipe.fanned_out:
+            return
+        batch_size = settings.FEED_FANOUT_BATCH_SIZE
+        last_pk = 0
+        while True:
+            # Keyset batches, so no follower list is held in memory.
+            batch = list(
+                Subscription.objects.filter(
+                    author_id=recipe.author_id, pk__gt=last_pk
+                )
+                .order_by("pk")
+                .values_list("pk", "user_id")[:batch_size]
+            )
+            if not batch:
+                return
+            self.bulk_create(
+                [
+                    self.model(user_id=user_id, recipe_id=recipe.pk)
+                    for _, user_id in batch
+                ],
+                ignore_conflicts=True,
+            )
+            last_pk = batch[-1][0]
+
+    def backfill(self, user, author):
+        """Copy recent fanned out recipes of a newly followed author."""
+        self.bulk_create(
+            [
+                self.model(user_id=user.pk, recipe_id=recipe_id)
+                for recipe_id in Recipe.objects.filter(
+                    author=author, fanned_out=True
+                )
+                .order_by("-id")
+                .values_list("id", flat=True)[: settings.FEED_BACKFILL_SIZE]
+            ],
+            ignore_conflicts=True,
+        )
+
+    def remove(self, user_id, author_id):
+        """Drop recipes of an unfollowed author from a timeline."""
+        self.filter(user_id=user_id, recipe__author_id=author_id).delete()
+
+    def trim(self, size):
+        """Keep the newest ``size`` entries of every timeline.
+
+        Returns the number of deleted entries.
+        """
+        deleted = 0
+        users = (
+            self.values("user_id")
+            .annotate(entries=models.Count("*"))
+            .filter(entries__gt=size)
+            .values_list("user_id", flat=True)
+            .order_by()
+        )
+        for user_id in users.iterator():
+            oldest_kept = (
+                self.filter(user_id=user_id)
+                .order_by("-recipe_id")
+                .values_list("recipe_id", flat=True)[size - 1]
+            )
+            deleted += self.filter(
+                user_id=user_id, recipe_id__lt=oldest_kept
+            ).delete()[0]
+        return deleted
+
+    def feed_ids(self, user, limit, after=None, reverse=False):
+        """Ids of up to ``limit`` recipes in the feed of ``user``.
+
+        The feed is ordered by id, newest first. Ids follow the ``after``
+        id, or precede it, nearest first, if ``reverse``. Both the
+        timeline and the recipes read from followed authors are limited
+        by a keyset of their own before they are merged.
+        """
+        lookup, descending = ("gt", "") if reverse else ("lt", "-")
+        entries = self.filter(user=user)
+        recipes = Recipe.objects.filter(
+            fanned_out=False,
+            author_id__in=Subscription.objects.filter(user=user).values(
+                "author_id"
+            ),
+        )
+        if after is not None:
+            entries = entries.filter(**{f"recipe_id__{lookup}": after})
+            recipes = recipes.filter(**{f"id__{lookup}": after})
+        entries = entries.order_by(f"{descending}recipe_id")
+        recipes = recipes.order_by(f"{descending}id")
+        recipe_ids = {
+            *entries.values_list("recipe_id", flat=True)[:limit],
+            *recipes.values_list("id", flat=True)[:limit],
+        }
+        return sorted(recipe_ids, reverse=not reverse)[:limit]
+
+
+class TimelineEntry(models.Model):
+    """Recipe in the feed of a follower of its author"""
+
+    # Indexed by unique_timeline_entry.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="пользователь",
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="рецепт",
+    )
+
+    objects = TimelineManager()
+
+    class Meta:
+        ordering = ("user", "-recipe_id")
+        verbose_name = "запись ленты"
+        verbose_name_plural = "записи ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_timeline_entry"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.recipe}"
+
+
+class SimilarRecipe(models.Model):
+    """Precomputed neighbour of a recipe by ingredients.
+
+    Filled by the compute_similar_recipes command.
+    """
+
+    # Indexed by similarrecipe_recipe_score_idx.
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_recipes",
+        verbose_name="рецепт",
+        db_index=False,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="похожий рецепт",
+    )
+    score = models.FloatField("сходство")
+
+    class Meta:
+        # By id, "recipe" would join recipes_recipe to sort by its name.
+        ordering = ("recipe_id", "-score")
+        verbose_name = "похожий рецепт"
+        verbose_name_plural = "похожие рецепты"
+        indexes = [
+            # Neighbours of a recipe, most similar first.
+            models.Index(
+                fields=["recipe", "-score"],
+                name="similarrecipe_recipe_score_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "similar"], name="unique_similar_recipe"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} - {self.similar} ({self.score:.3f})"
+
+
+class RecipeIndexChangeManager(models.Manager):
+    """Log of recipe changes for the in-process recipe index.
+
+    Ids are the change sequence, see recipes.recipe_index. A row without
+    a recipe makes every process rebuild its index, e.g. after imports.
+    Rows older than RECIPE_INDEX_CHANGE_RETENTION are deleted by the
+    trim_recipe_index_changes command.
+    """
+
+    def log(self, recipe_ids=None):
+        """Record changed recipes, or a full rebuild if None."""
+        with transaction.atomic(using=self.db):
+            connection = connections[self.db]
+            if connection.vendor == "postgresql":
+                # Ids are taken before commit, so concurrent writers could
+                # commit them out of order and an index would skip the
+                # smaller one. Reads don't wait for this lock.
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"LOCK TABLE {self.model._meta.db_table} "
+                        "IN EXCLUSIVE MODE"
+                    )
+            self.bulk_create(
+                [self.model(recipe_id=pk) for pk in recipe_ids]
+                if recipe_ids is not None
+                else [self.model()]
+            )
+
+    def sequence(self):
+        """Id of the last change, 0 if there are none."""
+        return self.aggregate(sequence=models.Max("pk"))["sequence"] or 0
+
+    def changed_ids(self, start, end, limit):
+        """Ids of recipes changed after ``start`` up to ``end`` sequence.
+
+        Returns None when the index has to be rebuilt instead: there are
+        more than ``limit`` changes, a full rebuild was logged or changes
+        since ``start`` were deleted already, e.g. by a database restore.
+        """
+        if start >= end or not self.filter(pk__lte=max(start, 1)).exists():
+            return None
+        recipe_ids = list(
+            self.filter(pk__gt=start, pk__lte=end).values_list(
+                "recipe_id", flat=True
+            )[: limit + 1]
+        )
+        if len(recipe_ids) > limit or None in recipe_ids:
+            return None
+        return set(recipe_ids)
+
+    def trim(self, before):
+        """Delete changes logged before ``before`` but the last one.
+
+        Returns the number of deleted changes.
+        """
+        return self.filter(
+            created__lt=before, pk__lt=self.sequence()
+        ).delete()[0]
+
+
+class RecipeIndexChange(models.Model):
+    """Change of a recipe's ingredients, see RecipeIndexChangeManager"""
+
+    # Not a foreign key, deletions of recipes are logged too.
+    recipe_id = models.BigIntegerField("id рецепта", null=True)
+    created = models.DateTimeField("создано", auto_now_add=True)
+
+    objects = RecipeIndexChangeManager()
+
+    class Meta:
+        ordering = ("id",)
+        verbose_name = "изменение индекса рецептов"
+        verbose_name_plural = "изменения индекса рецептов"
+
+    def __str__(self):
+        return f"{self.pk}: {self.recipe_id or 'перестроение'}"
@@ -0,0 +1,49 @@
+"""Per-user overlay of the user-specific flags in recipe responses.
+
+The overlay holds the ids of the user's favorite recipes, shopping cart
+recipes and followed authors, so ``is_favorited``, ``is_in_shopping_cart``
+and ``is_subscribed`` are set lookups. recipes.signals drop a cached
+overlay when one of its relations changes, updating it in place would
+race with concurrent changes of the same user.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import FavoriteRecipe, ShoppingCart, Subscription
+
+USER_OVERLAY_KEY = "user_overlay:{user_id}"
+FAVORITES = "favorites"
+SHOPPING_CART = "shopping_cart"
+SUBSCRIPTIONS = "subscriptions"
+
+
+def get_user_overlay(user_id):
+    """``{FAVORITES: ids, SHOPPING_CART: ids, SUBSCRIPTIONS: ids}``."""
+    cache_key = USER_OVERLAY_KEY.format(user_id=user_id)
+    overlay = cache.get(cache_key)
+    if overlay is None:
+        overlay = {
+            FAVORITES: set(
+                FavoriteRecipe.objects.filter(user_id=user_id).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            SHOPPING_CART: set(
+                ShoppingCart.objects.filter(user_id=user_id).values_list(
+                    "recipe_id", flat=True
+                )
+            ),
+            SUBSCRIPTIONS: set(
+                Subscription.objects.filter(user_id=user_id).values_list(
+                    "author_id", flat=True
+                )
+            ),
+        }
+        cache.set(cache_key, overlay, settings.USER_OVERLAY_CACHE_TIMEOUT)
+    return overlay
+
+
+def invalidate_user_overlay(user_id):
+    """Reload the user's overlay on next use."""
+    cache.delete(USER_OVERLAY_KEY.format(user_id=user_id))
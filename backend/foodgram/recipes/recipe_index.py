@@ -0,0 +1,248 @@
+"""Per-process inverted index of recipes by ingredient.
+
+Answers "what can I cook with these ingredients" without grouping
+RecipeIngredient rows per request. Every ingredient maps to a sorted
+array of recipe ids and every recipe to its number of ingredients, both
+in ``array`` buffers rather than lists of Python ints.
+
+Recipe writes log the changed recipe ids in RecipeIndexChange, whose
+ids number the changes, processes reload only those recipes. Bulk
+imports log a full rebuild, the index is loaded from scratch then.
+Rebuilds run in a background thread, requests get the previous
+snapshot until it is done; foodgram.wsgi loads the first one on start.
+"""
+
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.db import connections
+
+from .models import RecipeIndexChange, RecipeIngredient
+
+# Recipe ids are BigAutoField values.
+ID_TYPECODE = "q"
+SIZE_TYPECODE = "I"
+LOAD_CHUNK_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+class RecipeIndexSnapshot:
+    """Immutable state of the index for one change sequence."""
+
+    def __init__(self, sequence, postings, recipe_ids, sizes):
+        self.sequence = sequence
+        # Ingredient id -> sorted array of recipe ids.
+        self.postings = postings
+        # Sorted recipe ids and their numbers of ingredients.
+        self.recipe_ids = recipe_ids
+        self.sizes = sizes
+
+    @classmethod
+    def load(cls, sequence):
+        postings = {}
+        sizes = Counter()
+        rows = (
+            RecipeIngredient.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        for ingredient_id, recipe_id in rows:
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array(ID_TYPECODE)
+            posting.append(recipe_id)
+            sizes[recipe_id] += 1
+        recipe_ids = array(ID_TYPECODE, sorted(sizes))
+        return cls(
+            sequence,
+            postings,
+            recipe_ids,
+            array(SIZE_TYPECODE, (sizes[pk] for pk in recipe_ids)),
+        )
+
+    def updated(self, sequence, changed_ids):
+        """Copy of the snapshot with ``changed_ids`` reloaded.
+
+        Arrays without changed recipes are shared with this snapshot.
+        """
+        changed_ids = sorted(changed_ids)
+        postings = dict(self.postings)
+        copied = set()
+
+        def writable(ingredient_id):
+            if ingredient_id not in copied:
+                postings[ingredient_id] = array(
+                    ID_TYPECODE, postings.get(ingredient_id, ())
+                )
+                copied.add(ingredient_id)
+            return postings[ingredient_id]
+
+        for ingredient_id, posting in self.postings.items():
+            for recipe_id in changed_ids:
+                if contains(posting, recipe_id):
+                    ids = writable(ingredient_id)
+                    del ids[bisect_left(ids, recipe_id)]
+        recipe_ids = array(ID_TYPECODE, self.recipe_ids)
+        sizes = array(SIZE_TYPECODE, self.sizes)
+        for recipe_id in changed_ids:
+            if contains(recipe_ids, recipe_id):
+                position = bisect_left(recipe_ids, recipe_id)
+                del recipe_ids[position]
+                del sizes[position]
+
+        new_sizes = Counter()
+        for ingredient_id, recipe_id in RecipeIngredient.objects.filter(
+            recipe_id__in=changed_ids
+        ).values_list("ingredient_id", "recipe_id"):
+            insort(writable(ingredient_id), recipe_id)
+            new_sizes[recipe_id] += 1
+        for recipe_id, size in new_sizes.items():
+            position = bisect_left(recipe_ids, recipe_id)
+            recipe_ids.insert(position, recipe_id)
+            sizes.insert(position, size)
+
+        for ingredient_id in copied:
+            if not postings[ingredient_id]:
+                del postings[ingredient_id]
+        return type(self)(sequence, postings, recipe_ids, sizes)
+
+    def match(self, ingredient_ids):
+        """Recipes with any of the ingredients, best covered first.
+
+        Returns RankedMatches of ``(recipe_id, matched, total)`` tuples.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            # Counter counts an iterable in C.
+            matched.update(self.postings.get(ingredient_id, ()))
+        return RankedMatches(self, matched)
+
+
+class RankedMatches(Sequence):
+    """Matches in the order of RecipeIndexSnapshot.match(), ranked lazily.
+
+    Recipes are ordered by the share of their ingredients present, then
+    by the number of missing ones and newest first. Only the matches up
+    to the end of a requested slice are ranked, with a heap, instead of
+    sorting all of them for one page.
+    """
+
+    def __init__(self, snapshot, matched):
+        self.snapshot = snapshot
+        # Recipe id -> number of the ingredients it has.
+        self.matched = matched
+
+    def __len__(self):
+        return len(self.matched)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            stop = index.stop
+            if stop is None or stop < 0:
+                stop = len(self)
+            return self.top(stop)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("match index out of range")
+        return self.top(index + 1)[index]
+
+    def top(self, count):
+        recipe_ids = self.snapshot.recipe_ids
+        sizes = self.snapshot.sizes
+        return heapq.nsmallest(
+            count,
+            (
+                (
+                    recipe_id,
+                    matched,
+                    sizes[bisect_left(recipe_ids, recipe_id)],
+                )
+                for recipe_id, matched in self.matched.items()
+            ),
+            key=lambda item: (
+                -item[1] / item[2],
+                item[2] - item[1],
+                -item[0],
+            ),
+        )
+
+
+class RecipeIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._reloading = False
+
+    def get(self):
+        """Return a snapshot, loading the index on first use.
+
+        Logged changes are applied right away. A full reload runs in a
+        background thread, the previous snapshot is served meanwhile.
+        """
+        sequence = RecipeIndexChange.objects.sequence()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.sequence == sequence:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                self._snapshot = RecipeIndexSnapshot.load(sequence)
+            elif snapshot.sequence != sequence:
+                changed_ids = RecipeIndexChange.objects.changed_ids(
+                    snapshot.sequence,
+                    sequence,
+                    settings.RECIPE_INDEX_MAX_CHANGES,
+                )
+                if changed_ids is None:
+                    if not self._reloading:
+                        self._reloading = True
+                        self._start(self._reload)
+                else:
+                    self._snapshot = snapshot.updated(sequence, changed_ids)
+            return self._snapshot
+
+    def warm(self):
+        """Load the index in a background thread, e.g. on process start."""
+        self._start(self.get)
+
+    def _start(self, target):
+        threading.Thread(
+            target=self._run, args=(target,), name="recipe-index", daemon=True
+        ).start()
+
+    def _reload(self):
+        try:
+            # The sequence is read before the rows, changes logged while
+            # loading are applied again on the next update.
+            snapshot = RecipeIndexSnapshot.load(
+                RecipeIndexChange.objects.sequence()
+            )
+            with self._lock:
+                self._snapshot = snapshot
+        finally:
+            self._reloading = False
+
+    @staticmethod
+    def _run(target):
+        try:
+            target()
+        except Exception:
+            logger.exception("Failed to load the recipe index")
+        finally:
+            connections.close_all()
+
+
+recipe_index = RecipeIndex()
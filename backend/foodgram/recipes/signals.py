@@ -0,0 +1,279 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .cache import (
+    change_model_count,
+    invalidate_ingredient_index,
+    invalidate_recipes,
+    invalidate_shopping_lists,
+)
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIndexChange,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscription,
+    TimelineEntry,
+    User,
+)
+from .counters import change_counter
+from .images import needs_variants, schedule_variants
+from .overlay import invalidate_user_overlay
+
+# User fields shown in recipe responses.
+AUTHOR_PROFILE_FIELDS = {
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "avatar",
+}
+
+
+def invalidate_recipes_on_commit(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+
+
+def invalidate_recipe_carts(recipe_id):
+    """Drop shopping lists of the users with the recipe in their cart."""
+    invalidate_shopping_lists(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_recipe(instance.user, instance.recipe)
+        invalidate_shopping_lists([instance.user_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: the recipe ingredients are still there when the cart row
+    # goes away in a cascade from Recipe.
+    ShoppingListItem.objects.remove_recipe(instance.user, instance.recipe)
+    invalidate_shopping_lists([instance.user_id])
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, raw, **kwargs):
+    instance.old_amounts = {}
+    if not (raw or instance._state.adding):
+        instance.old_amounts = dict(
+            RecipeIngredient.objects.filter(pk=instance.pk).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def change_shopping_lists(sender, instance, raw, **kwargs):
+    # Rows saved one by one, e.g. by admin inlines. The API writes them
+    # in bulk and applies the changes itself.
+    if raw:
+        return
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id,
+        instance.old_amounts,
+        {instance.ingredient_id: instance.amount},
+    )
+    invalidate_recipe_carts(instance.recipe_id)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def subtract_from_shopping_lists(sender, instance, origin, **kwargs):
+    # Deleting a recipe removes it from carts in remove_from_shopping_list,
+    # and deleting an ingredient or a user cascades to the list items.
+    if isinstance(origin, QuerySet):
+        origin = origin.model
+    elif origin is not None:
+        origin = type(origin)
+    if origin is not RecipeIngredient:
+        return
+    # Stored amounts, admin inlines edit the instance before deleting it.
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id,
+        dict(
+            RecipeIngredient.objects.filter(pk=instance.pk).values_list(
+                "ingredient_id", "amount"
+            )
+        ),
+        {},
+    )
+    invalidate_recipe_carts(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_shopping_lists(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipe_carts(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_shopping_lists(sender, instance, created, **kwargs):
+    # Names, units and densities are part of the shopping list document.
+    if not created:
+        invalidate_shopping_lists(
+            ShoppingListItem.objects.filter(ingredient=instance).values_list(
+                "user_id", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredient_index(sender, **kwargs):
+    transaction.on_commit(invalidate_ingredient_index)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_created(sender, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: change_model_count(sender, 1))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def count_deleted(sender, **kwargs):
+    transaction.on_commit(lambda: change_model_count(sender, -1))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    invalidate_recipes_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient_responses(sender, instance, **kwargs):
+    invalidate_recipes_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_index(sender, instance, **kwargs):
+    # The API and the admin save the recipe along with its ingredients,
+    # which are written with bulk_create and send no signals.
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: RecipeIndexChange.objects.log([recipe_id]))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_responses(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes_on_commit(
+            instance.recipe_ingredients.values_list("recipe_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if created or (
+        update_fields is not None
+        and not AUTHOR_PROFILE_FIELDS.intersection(update_fields)
+    ):
+        return
+    invalidate_recipes_on_commit(instance.recipes.values_list("id", flat=True))
+
+
+def invalidate_overlay_on_commit(user_id):
+    transaction.on_commit(lambda: invalidate_user_overlay(user_id))
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def invalidate_overlay_on_add(sender, instance, created, **kwargs):
+    if created:
+        invalidate_overlay_on_commit(instance.user_id)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def invalidate_overlay_on_remove(sender, instance, **kwargs):
+    invalidate_overlay_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def render_recipe_image_variants(sender, instance, **kwargs):
+    if needs_variants(instance, "image"):
+        schedule_variants(instance, "image")
+
+
+@receiver(post_save, sender=User)
+def render_avatar_variants(sender, instance, **kwargs):
+    if needs_variants(instance, "avatar"):
+        schedule_variants(instance, "avatar")
+
+
+# Counted model: ((counter model, field pointing to it, counter), ...)
+COUNTED_RELATIONS = {
+    FavoriteRecipe: ((Recipe, "recipe_id", "favorites_count"),),
+    Recipe: ((User, "author_id", "recipes_count"),),
+    Subscription: (
+        (User, "author_id", "followers_count"),
+        (User, "user_id", "following_count"),
+    ),
+}
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        for model, field, counter in COUNTED_RELATIONS[sender]:
+            change_counter(model, getattr(instance, field), counter, 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counters(sender, instance, **kwargs):
+    for model, field, counter in COUNTED_RELATIONS[sender]:
+        change_counter(model, getattr(instance, field), counter, -1)
+
+
+@receiver(pre_save, sender=Recipe)
+def decide_fan_out(sender, instance, raw, **kwargs):
+    # Fixed on creation, so the recipe stays in the same feed path when
+    # its author's follower count changes.
+    if instance._state.adding and not raw:
+        instance.fanned_out = TimelineEntry.objects.is_fanned_out(
+            instance.author
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: TimelineEntry.objects.fan_out(instance))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        TimelineEntry.objects.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Subscription)
+def clean_timeline(sender, instance, **kwargs):
+    TimelineEntry.objects.remove(instance.user_id, instance.author_id)
@@ -0,0 +1,60 @@
+"""Content-addressed storage of recipe images and avatars."""
+
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Store files under the SHA-256 of their content.
+
+    ``recipes/temp.jpeg`` is saved as ``recipes/ab/ab12….jpeg``, so equal
+    uploads share one file and a URL always points to the same bytes.
+    Files may be shared by several objects, so delete() leaves them in
+    place and the collect_media_garbage command removes unreferenced ones.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the digest in _save().
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        hashed_name = posixpath.join(
+            directory,
+            digest[:2],
+            digest + os.path.splitext(filename)[1].lower(),
+        )
+        if self.exists(hashed_name):
+            # Reused now, so collect_media_garbage must treat it as new.
+            os.utime(self.path(hashed_name))
+            return hashed_name
+
+        # Written under a unique name and renamed, so a concurrent request
+        # never serves a partially written file.
+        temporary_name = super()._save(
+            super().get_available_name(
+                posixpath.join(directory, digest[:2], f".{digest}.upload")
+            ),
+            content,
+        )
+        os.replace(self.path(temporary_name), self.path(hashed_name))
+        return hashed_name
+
+    def delete(self, name):
+        pass
+
+    def purge(self, name):
+        """Delete a file, which must not be referenced any more."""
+        super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
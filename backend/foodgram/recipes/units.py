@@ -0,0 +1,89 @@
+"""Measurement units and their conversion to canonical units.
+
+Mass units convert to grams and volume units to millilitres. Volumes of
+ingredients with a known density are converted to grams too, so the
+same product in "г", "кг" and "мл" adds up to one shopping list line.
+Units without a conversion, like "шт.", are kept as they are.
+"""
+
+import re
+
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+MASS_UNIT = "г"
+VOLUME_UNIT = "мл"
+
+# unit: (canonical unit, canonical units in one unit)
+UNITS = {
+    "мг": (MASS_UNIT, 0.001),
+    "г": (MASS_UNIT, 1),
+    "кг": (MASS_UNIT, 1000),
+    "мл": (VOLUME_UNIT, 1),
+    "л": (VOLUME_UNIT, 1000),
+    "капля": (VOLUME_UNIT, 0.05),
+    "ч. л.": (VOLUME_UNIT, 5),
+    "ст. л.": (VOLUME_UNIT, 15),
+    "стакан": (VOLUME_UNIT, 250),
+}
+VOLUME_UNITS = [
+    unit for unit, (canonical, _) in UNITS.items() if canonical == VOLUME_UNIT
+]
+
+# Spellings found in ingredient files: unit
+UNIT_ALIASES = {
+    "гр": "г",
+    "грамм": "г",
+    "килограмм": "кг",
+    "миллиграмм": "мг",
+    "миллилитр": "мл",
+    "литр": "л",
+    "шт": "шт.",
+    "штука": "шт.",
+    "ч.л.": "ч. л.",
+    "чайная ложка": "ч. л.",
+    "ст.л.": "ст. л.",
+    "столовая ложка": "ст. л.",
+}
+
+
+def normalize_unit(unit):
+    """Lowercased unit with single spaces and known aliases resolved."""
+    unit = re.sub(r"\s+", " ", unit.strip().lower())
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def canonical_unit(unit, density):
+    """Expression of the canonical unit for ``unit`` and ``density`` fields."""
+    return Case(
+        When(
+            Q(**{f"{density}__isnull": False, f"{unit}__in": VOLUME_UNITS}),
+            then=Value(MASS_UNIT),
+        ),
+        *(
+            When(**{unit: name}, then=Value(canonical))
+            for name, (canonical, _) in UNITS.items()
+            if name != canonical
+        ),
+        default=F(unit),
+    )
+
+
+def canonical_amount(amount, unit, density):
+    """Expression of ``amount`` converted to canonical_unit()."""
+    return Case(
+        *(
+            When(
+                Q(**{unit: name, f"{density}__isnull": False}),
+                then=F(amount) * Value(float(UNITS[name][1])) * F(density),
+            )
+            for name in VOLUME_UNITS
+        ),
+        *(
+            When(**{unit: name}, then=F(amount) * Value(float(factor)))
+            for name, (_, factor) in UNITS.items()
+            if factor != 1
+        ),
+        default=Cast(amount, FloatField()),
+        output_field=FloatField(),
+    )